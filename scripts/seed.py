@@ -1,88 +1,52 @@
-import getpass
+import argparse
+import bisect
+import collections
 import itertools
 import json
 import math
+import operator
 import os
 import random
 import time
 
-from sqlalchemy import (
+from sqlalchemy import null
+
+from smallville.base import (
+    Base,
+    build_deferred_schema,
+    create_tables_deferred)
+from smallville.bulk import BulkSaver
+from smallville.compact import (
+    CompactBase,
+    encode_names,
+    is_compact)
+from smallville.connection import (
+    bulk_sessionmaker,
     create_engine,
-    null)
-from sqlalchemy.orm import sessionmaker
-
-from smallville.base import Base
+    database_url,
+    sqlite_bulk_load)
 from smallville.generators import (
+    ROLE_PERCENTILES,
+    ROLES,
     CompanyGenerator,
     PopulationGenerator,
-    city_generator)
+    city_generator,
+    role_salaries,
+    synthetic_cities)
+from smallville.metrics import SeedMetrics
 from smallville.models import (
+    City,
     Company,
     Employment,
     Person,
     TransportLink)
 from smallville.pathfinding import dijkstra
+from smallville.statistics import (
+    refresh_commute_distances,
+    refresh_statistics)
 
-
-class BulkSaver:
-    """Chunked bulk insert/update utility.
-
-    This provides a wrapper around SQLAlchemy's Session.bulk_save_objects,
-    providing both grouping of inserts by their mapped class, as well as
-    chunked inserts based on a configurable threshold.
-
-    A flush is triggered once the number of pending objects meets the threshold
-    value. The inserts are then performed in the order of the mappings as
-    provided on initiation of the BulkSaver. This allows non-cyclical
-    foreign keys to resolve correctly (provided the Mapping order is correct.)
-    """
-    def __init__(self, session, *mappings, threshold=2000):
-        self.session = session
-        self.mappings = mappings
-        self.threshold = threshold
-        self._objects = {mapping: [] for mapping in mappings}
-        self._mappings = {mapping: [] for mapping in mappings}
-        self._pending = 0
-
-    def __enter__(self):
-        return self
-
-    def __exit__(self, type, value, traceback):
-        if type is None:
-            self.flush()
-
-    def _increment_pending(self):
-        """Increments the 'pending' count and flushes when over threshold."""
-        self._pending += 1
-        if self._pending >= self.threshold:
-            self.flush()
-
-    def add_mapping(self, type_, mapping):
-        """Adds a type+mapping to the collection, or nothing when `None`.
-
-        Automatically flushes all pending objects when threshold is reached.
-        """
-        if mapping is not None:
-            self._mappings[type_].append(mapping)
-            self._increment_pending()
-
-    def add_object(self, obj):
-        """Adds an object to the pending collection, or nothing when `None`.
-
-        Automatically flushes all pending objects when threshold is reached.
-        """
-        if obj is not None:
-            self._objects[type(obj)].append(obj)
-            self._increment_pending()
-
-    def flush(self):
-        """Bulk-saves objects to the database, in mapping order."""
-        for mapping in self.mappings:
-            self.session.bulk_insert_mappings(mapping, self._mappings[mapping])
-            self._mappings[mapping] = []
-            self.session.bulk_save_objects(self._objects.pop(mapping))
-            self._objects[mapping] = []
-        self._pending = 0
+CitySeed = collections.namedtuple(
+    'CitySeed', 'id name size_code company_count population_size')
 
 
 # #############################################################################
@@ -94,10 +58,18 @@ def connect(db, user=None, echo=False):
     Optionally allows for specifiation of a user name (defaults to the current
     process user, and statement echo/verbosity.
     """
-    if user is None:
-        user = getpass.getuser()
-    return create_engine(
-        f'postgres://{user}@/{db}', echo=echo, use_batch_mode=True)
+    return create_engine(database_url(db, user), echo=echo)
+
+
+def connect_sqlite(filename, echo=False, cache_size_mb=512):
+    """Creates and returns a database engine for a SQLite database file.
+
+    Every connection is configured for bulk loading rather than durability,
+    see `smallville.connection.sqlite_bulk_load`. Inserts from the BulkSaver
+    are already grouped per mapping and sent using executemany.
+    """
+    engine = create_engine(f'sqlite:///{filename}', echo=echo)
+    return sqlite_bulk_load(engine, cache_size_mb=cache_size_mb)
 
 
 def seed_entries(seed_file):
@@ -131,16 +103,34 @@ def split_field(split_on):
     return _splitter
 
 
+def company_generator():
+    """Returns a CompanyGenerator configured from the seed data."""
+    company_params = seed_json('business')
+    company_params['names']['finalizer'] += company_params['names']['suffix']
+    return CompanyGenerator(**company_params)
+
+
+def population_generator():
+    """Returns a PopulationGenerator configured from the seed data."""
+    return PopulationGenerator(
+        map(shuffle_infix, seed_entries('last_names')),
+        seed_entries('first_names_feminine'),
+        seed_entries('first_names_masculine'))
+
+
 # #############################################################################
 # Seed functions
 #
-def create_cities(session):
-    """Creates cities for people to live in and companies to work at."""
-    company_params = seed_json('business')
-    company_params['names']['finalizer'] += company_params['names']['suffix']
+def create_cities(session, limit=None):
+    """Creates cities for people to live in and companies to work at.
+
+    Cities are created from the seed city list, optionally limited to the
+    first `limit` entries to create a smaller world.
+    """
     make_city = city_generator(**seed_json('cities'))
-    make_company = CompanyGenerator(**company_params)
-    names_and_sizes = map(split_field(';'), seed_entries('cities'))
+    make_company = company_generator()
+    names_and_sizes = itertools.islice(
+        map(split_field(';'), seed_entries('cities')), limit)
     for city in itertools.starmap(make_city, names_and_sizes):
         size_args = itertools.repeat(city.size_code, city.seed_company_count)
         city.companies = [make_company(size) for size in size_args]
@@ -149,6 +139,57 @@ def create_cities(session):
     session.flush()
 
 
+def create_world(session, city_count):
+    """Streams a synthesized world of `city_count` cities into the database.
+
+    City sizes follow the size distribution of the seed city list, and their
+    population and company counts are drawn from the same parameters used by
+    `create_cities`. Rather than keeping all cities and companies in memory,
+    each city is generated, populated, employed and queued for bulk insertion
+    before moving on to the next one. Memory use is bounded by the largest
+    single city rather than the size of the world.
+
+    As companies are discarded once their city is done, no commuters are
+    created. Instead, the unemployed receive income from self-employment at
+    the same rate as `create_self_employment` would assign it.
+
+    Yields a CitySeed record (a small namedtuple) for every city created.
+    """
+    make_city = city_generator(**seed_json('cities'))
+    make_company = company_generator()
+    make_people = population_generator()
+    names, sizes = zip(*map(split_field(';'), seed_entries('cities')))
+    size_weights = collections.Counter(sizes)
+    city_serial, company_serial, person_serial = (
+        itertools.count(1) for _ in range(3))
+    with BulkSaver(session, City, Company, Person, Employment) as batch:
+        world = synthetic_cities(names, size_weights, city_count)
+        for city in itertools.starmap(make_city, world):
+            city_id = next(city_serial)
+            batch.add_mapping(City, {
+                'id': city_id, 'name': city.name, 'size_code': city.size_code})
+            companies = []
+            for _step in range(city.seed_company_count):
+                company = make_company(city.size_code)
+                company.id = next(company_serial)
+                company.city_id = city_id
+                companies.append(company)
+                batch.add_object(company)
+            for person in make_people(city.seed_population_size):
+                person['id'] = next(person_serial)
+                person['city_id'] = city_id
+                person['self_employment_income'] = None
+                employment = employ_person(person, companies)
+                if employment is None and companies and random.random() > 0.5:
+                    person['self_employment_income'] = self_employment_income(
+                        companies[0].seed_salary())
+                batch.add_mapping(Person, person)
+                batch.add_mapping(Employment, employment)
+            yield CitySeed(
+                city_id, city.name, city.size_code,
+                city.seed_company_count, city.seed_population_size)
+
+
 def create_transport_network(session, cities):
     """Creates a number of transport links between cities.
 
@@ -162,18 +203,41 @@ def create_transport_network(session, cities):
     most (if not all) nodes within 3 hops of each other.
     """
     params = seed_json('transport')
-    chain_count = len(cities) ** (1 / params['max_hop_distance'])
     dist = lambda: round(random.uniform(*params['distance_range']))  # noqa
+    key = operator.attrgetter('id')
+    for lower, higher in transport_pairs(cities, params, key=key):
+        yield TransportLink(
+            lower_city=lower, higher_city=higher, distance=dist())
 
-    created_links = set()
-    for _repeat in range(round(chain_count - 0.25)):  # biased rounding
-        shuffled_cities = random.sample(cities, len(cities))
-        for city, neighbour in pairwise_full_circle(shuffled_cities):
-            lower, higher = sorted((city, neighbour), key=lambda city: city.id)
-            if (lower, higher) not in created_links:
-                created_links.add((lower, higher))
-                yield TransportLink(
-                    lower_city=lower, higher_city=higher, distance=dist())
+
+def create_transport_links(session, cities, topology=None):
+    """Bulk-saves a transport network between cities, linked by their id.
+
+    This creates the same network as `create_transport_network`, but does not
+    require the cities to be mapped objects. Any object with an `id` attribute
+    (such as the CitySeed records from `create_world`) will do. Returns the
+    number of transport links created.
+
+    Given a `topology`, the network is instead built by the vectorised
+    `smallville.networks.transport_network` (this requires numpy).
+    """
+    params = seed_json('transport')
+    city_ids = [city.id for city in cities]
+    if topology is None:
+        links = (
+            (lower, higher, round(random.uniform(*params['distance_range'])))
+            for lower, higher in transport_pairs(city_ids, params))
+    else:
+        links = network_links(city_ids, topology, params)
+    link_count = 0
+    with BulkSaver(session, TransportLink) as batch:
+        for lower, higher, distance in links:
+            link_count += 1
+            batch.add_mapping(TransportLink, {
+                'lower_city_id': lower,
+                'higher_city_id': higher,
+                'distance': distance})
+    return link_count
 
 
 def create_population(session, cities):
@@ -191,10 +255,7 @@ def create_population(session, cities):
     These changes combined reduce insert time by approximately 60%, and reduce
     the memory footprint from around 1GB to ~50MB.
     """
-    make_people = PopulationGenerator(
-        map(shuffle_infix, seed_entries('last_names')),
-        seed_entries('first_names_feminine'),
-        seed_entries('first_names_masculine'))
+    make_people = population_generator()
     serial = itertools.count(1)
     with BulkSaver(session, Person, Employment) as batch:
         for city in cities:
@@ -234,31 +295,62 @@ def create_self_employment(session):
         for person in unemployed_people(session):
             if random.random() > 0.5:
                 city_salary = person.city.companies[0].seed_salary()
-                salary_multiplier = random.uniform(0.5, 1.2)
-                person.self_employment_income = city_salary * salary_multiplier
+                person.self_employment_income = self_employment_income(
+                    city_salary)
                 batch.add_object(person)
 
 
 def employ_person(person, companies):
     """Assign the person an employer from a list of companies."""
-    def role_and_salary(salary):
-        percentile = random.random()
-        if percentile < 0.85:
-            return {'role': 'worker', 'salary': salary()}
-        if percentile < 0.9:
-            return {'role': 'manager', 'salary': max(salary(), salary())}
-        return {'role': 'director', 'salary': salary() + salary()}
-
     person_id = person['id'] if isinstance(person, dict) else person.id
     for company in companies:
         if random.random() < company.seed_hiring_chance:
             company.seed_employee_count += 1
             company.seed_hiring_chance = math.pow(
                 company.seed_hiring_slowdown, -company.seed_employee_count)
+            role = bisect.bisect(ROLE_PERCENTILES, random.random())
+            salary = role_salaries(
+                company.seed_salary(), company.seed_salary())[role]
             return dict(
                 person_id=person_id,
                 company_id=company.id,
-                **role_and_salary(company.seed_salary))
+                role=ROLES[role],
+                salary=round(salary))
+
+
+def self_employment_income(city_salary):
+    """Returns a self-employment income relative to a typical city salary."""
+    return round(city_salary * random.uniform(0.5, 1.2))
+
+
+def transport_pairs(cities, params, key=None):
+    """Yields unique (lower, higher) pairs of cities to link together.
+
+    The network is made of a number of full-circle chains over the shuffled
+    cities, where the number of chains is derived from the `max_hop_distance`
+    in the transport parameters. Pairs are ordered by the given `key` function.
+    """
+    chain_count = len(cities) ** (1 / params['max_hop_distance'])
+    created_links = set()
+    for _repeat in range(round(chain_count - 0.25)):  # biased rounding
+        shuffled_cities = random.sample(cities, len(cities))
+        for city, neighbour in pairwise_full_circle(shuffled_cities):
+            pair = tuple(sorted((city, neighbour), key=key))
+            if pair not in created_links:
+                created_links.add(pair)
+                yield pair
+
+
+def network_links(city_ids, topology, params):
+    """Returns (lower, higher, distance) tuples of a generated network."""
+    from smallville.networks import transport_network
+
+    topology_params = {}
+    if topology == 'chain':
+        topology_params['max_hop_distance'] = params['max_hop_distance']
+    edges = transport_network(
+        city_ids, topology, params['distance_range'], **topology_params)
+    return zip(*(column.tolist() for column in edges))
 
 
 def unemployed_people(session):
@@ -278,48 +370,228 @@ def pairwise_full_circle(sequence):
     return zip(this, ahead)
 
 
-def main():
-    def emit(text, start_time=time.time()):
-        elapsed = round((time.time() - start_time), 1)
-        print('[{:>4.1f}s] {}'.format(elapsed, '\n\t '.join(text.split('\n'))))
-
-    emit('(Re-)creating database and tables for SmallVille')
-    engine = connect('smallville')
-    Base.metadata.drop_all(bind=engine)
-    Base.metadata.create_all(bind=engine)
-
-    session = sessionmaker(bind=engine)()
-
+def parse_arguments(argv=None):
+    """Returns the parsed command line arguments for the seed script."""
+    parser = argparse.ArgumentParser(
+        description='Creates and seeds the SmallVille database.')
+    parser.add_argument(
+        '--sqlite', metavar='FILE',
+        help='seed a SQLite database file instead of PostgreSQL')
+    parser.add_argument(
+        '--scale', type=int, metavar='CITIES',
+        help='synthesize a world of this many cities, streamed to the '
+             'database in constant memory (skips commuters)')
+    parser.add_argument(
+        '--topology', choices=['chain', 'geometric', 'small_world'],
+        help='generate the transport network of a scaled world with this '
+             'topology, using numpy (default: chain, without numpy)')
+    parser.add_argument(
+        '--load-snapshot', metavar='DIR',
+        help='load a previously saved snapshot instead of generating a world')
+    parser.add_argument(
+        '--save-snapshot', metavar='DIR',
+        help='save the seeded world as a columnar snapshot (requires numpy)')
+    parser.add_argument(
+        '--metrics', type=argparse.FileType('w'), metavar='FILE',
+        help='write per-stage timing and memory metrics as JSON lines to '
+             'the given file (use - for stdout)')
+    parser.add_argument(
+        '--trace-memory', action='store_true',
+        help='record peak Python allocations per stage using tracemalloc '
+             '(slows down seeding considerably)')
+    parser.add_argument(
+        '--defer-schema', action='store_true',
+        help='create tables without secondary indexes and foreign keys, and '
+             'build those after the data has been loaded')
+    parser.add_argument(
+        '--compact-names', action='store_true',
+        help='store names and industries as keys into lookup tables, after '
+             'seeding (and saving a snapshot)')
+    parser.add_argument(
+        '--no-verify', dest='verify', action='store_false',
+        help='skip the COUNT queries that report on the seeded data')
+    args = parser.parse_args(argv)
+    if args.topology is not None and args.scale is None:
+        parser.error('--topology only applies to scaled worlds (--scale)')
+    return args
+
+
+def seed_world(session, emit, metrics, verify=True):
+    """Seeds the world from the city list, including commuters."""
     emit('Creating cities and companies ..')
-    cities = list(create_cities(session))
+    with metrics.stage('cities') as stage:
+        cities = list(create_cities(session))
+        company_count = sum(city.seed_company_count for city in cities)
+        stage.rows = len(cities) + company_count
     emit('  Number of cities: {}'.format(len(cities)))
-    emit('  Total company count: {}'.format(
-        sum(city.seed_company_count for city in cities)))
+    emit('  Total company count: {}'.format(company_count))
     emit('  Total population size: {}'.format(
         sum(city.seed_population_size for city in cities)))
 
     emit('Creating transport network ..')
-    network = list(create_transport_network(session, cities))
+    with metrics.stage('transport_network') as stage:
+        network = list(create_transport_network(session, cities))
+        session.flush()
+        stage.rows = len(network)
     emit(f'  Number of transport links: {len(network)}')
 
     emit('Creating population and employment ..')
-    create_population(session, cities)
-    emit('  Number of locally employed people: {}'.format(
-        session.query(Employment).count()))
-    create_commuters(session, cities)
-    emit('  Number of commuters: {}'.format(
-        session.query(Employment)
-        .join(Employment.person, Employment.company)
-        .filter(Person.city_id != Company.city_id)
-        .count()))
-    create_self_employment(session)
-    emit('  Number of (partially) self-employed: {}'.format(
-        session.query(Person)
-        .filter(Person.self_employment_income != null())
-        .count()))
+    with metrics.stage('population'):
+        create_population(session, cities)
+    if verify:
+        emit('  Number of locally employed people: {}'.format(
+            session.query(Employment).count()))
+    with metrics.stage('commuters'):
+        create_commuters(session, cities)
+    if verify:
+        emit('  Number of commuters: {}'.format(
+            session.query(Employment)
+            .join(Employment.person, Employment.company)
+            .filter(Person.city_id != Company.city_id)
+            .count()))
+    with metrics.stage('self_employment'):
+        create_self_employment(session)
+    if verify:
+        emit('  Number of (partially) self-employed: {}'.format(
+            session.query(Person)
+            .filter(Person.self_employment_income != null())
+            .count()))
+
+
+def seed_scaled_world(session, emit, metrics, city_count, topology=None):
+    """Seeds a synthesized world of the given number of cities."""
+    emit(f'Creating {city_count} cities, companies and population ..')
+    with metrics.stage('world'):
+        cities = list(create_world(session, city_count))
+    emit('  Total company count: {}'.format(
+        sum(city.company_count for city in cities)))
+    emit('  Total population size: {}'.format(
+        sum(city.population_size for city in cities)))
+
+    emit('Creating transport network ..')
+    with metrics.stage('transport_network'):
+        link_count = create_transport_links(session, cities, topology)
+    emit(f'  Number of transport links: {link_count}')
+
+
+def load_world(session, emit, metrics, path):
+    """Loads a world from a snapshot directory into the database."""
+    from smallville.snapshot import load_snapshot
+
+    emit(f'Loading snapshot from {path} ..')
+    with metrics.stage('load_snapshot') as stage:
+        row_counts = load_snapshot(session.connection(), path)
+        stage.rows = sum(row_counts.values())
+    for table, row_count in row_counts.items():
+        emit(f'  Number of {table} rows: {row_count}')
+
+
+def save_world(engine, emit, metrics, path):
+    """Saves the seeded world from the database to a snapshot directory."""
+    from smallville.snapshot import save_snapshot
+
+    emit(f'Saving snapshot to {path} ..')
+    with metrics.stage('save_snapshot') as stage:
+        with engine.connect() as connection:
+            snapshot = save_snapshot(connection, path)
+        stage.rows = sum(map(len, snapshot.tables.values()))
+
+
+def compute_commutes(session, emit, metrics):
+    """Stores the commute distance of every employment contract."""
+    emit('Computing commute distances ..')
+    with metrics.stage('commute_distances'):
+        pair_count = refresh_commute_distances(session.connection())
+    emit(f'  Number of home and work city pairs: {pair_count}')
+
+
+def build_schema(session, emit, metrics, metadata):
+    """Builds deferred indexes and constraints, reporting on each of them."""
+    emit('Building indexes and constraints ..')
+    with metrics.stage('build_schema') as stage:
+        for name, duration in build_deferred_schema(
+                session.connection(), metadata):
+            stage.rows += 1
+            emit(f'  Built {name} in {duration:.2f}s')
+            metrics.write({
+                'stage': 'build_schema', 'element': name,
+                'wall_time': duration})
+
+
+def schema_metadata(snapshot_path=None):
+    """Returns the metadata to create tables with, from the snapshot if any."""
+    if snapshot_path is None:
+        return Base.metadata
+    from smallville.snapshot import Snapshot
+
+    return Snapshot(snapshot_path).metadata
+
+
+def compact_names(engine, emit, metrics):
+    """Encodes names into lookup tables, and reclaims the space they took."""
+    with engine.connect() as connection:
+        if is_compact(connection):
+            emit('Names are already encoded into lookup tables')
+            return
+    emit('Encoding names into lookup tables ..')
+    with metrics.stage('encode_names'):
+        with engine.begin() as connection:
+            name_counts = encode_names(connection)
+    for name, count in name_counts.items():
+        emit(f'  Distinct values of {name}: {count}')
+    vacuum = 'VACUUM'
+    if engine.dialect.name == 'postgresql':
+        vacuum = 'VACUUM FULL'
+    with metrics.stage('vacuum'):
+        with engine.connect().execution_options(
+                isolation_level='AUTOCOMMIT') as connection:
+            connection.execute(vacuum)
+
+
+def main():
+    def emit(text, start_time=time.time()):
+        elapsed = round((time.time() - start_time), 1)
+        print('[{:>4.1f}s] {}'.format(elapsed, '\n\t '.join(text.split('\n'))))
+
+    args = parse_arguments()
+    metrics = SeedMetrics(stream=args.metrics, trace_memory=args.trace_memory)
+    emit('(Re-)creating database and tables for SmallVille')
+    if args.sqlite is not None:
+        engine = connect_sqlite(args.sqlite)
+    else:
+        engine = connect('smallville')
+    metadata = schema_metadata(args.load_snapshot)
+    with metrics.stage('create_tables'):
+        # The compact metadata includes the lookup tables of a converted world
+        CompactBase.metadata.drop_all(bind=engine)
+        if args.defer_schema:
+            create_tables_deferred(engine, metadata)
+        else:
+            metadata.create_all(bind=engine)
+
+    session = bulk_sessionmaker(engine, info={'metrics': metrics})()
+    if args.load_snapshot is not None:
+        load_world(session, emit, metrics, args.load_snapshot)
+    elif args.scale is None:
+        seed_world(session, emit, metrics, verify=args.verify)
+    else:
+        seed_scaled_world(session, emit, metrics, args.scale, args.topology)
+    if args.load_snapshot is None:
+        compute_commutes(session, emit, metrics)
+    if args.defer_schema:
+        build_schema(session, emit, metrics, metadata)
+
+    emit('Building city, company and industry statistics ..')
+    with metrics.stage('statistics'):
+        refresh_statistics(session.connection())
 
     emit('Committing ..')
-    session.commit()
+    with metrics.stage('commit'):
+        session.commit()
+    if args.save_snapshot is not None:
+        save_world(engine, emit, metrics, args.save_snapshot)
+    if args.compact_names:
+        compact_names(engine, emit, metrics)
     emit('All done!')
 
 
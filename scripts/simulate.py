@@ -0,0 +1,60 @@
+import argparse
+import datetime
+import time
+
+from seed import (
+    connect,
+    connect_sqlite,
+    seed_json)
+from smallville.simulation import Simulation
+from smallville.statistics import refresh_statistics
+
+
+def parse_arguments():
+    """Returns the parsed command line arguments for the simulation script."""
+    parser = argparse.ArgumentParser(
+        description='Runs a seeded SmallVille world forward in time.')
+    parser.add_argument(
+        'years', type=int, nargs='?', default=1,
+        help='number of years to simulate (default: 1)')
+    parser.add_argument(
+        '--sqlite', metavar='FILE',
+        help='simulate a SQLite database file instead of PostgreSQL')
+    parser.add_argument(
+        '--start', type=datetime.date.fromisoformat, metavar='YYYY-MM-DD',
+        help='date at which the simulation starts (default: today)')
+    parser.add_argument(
+        '--seed', type=int, help='random seed, for reproducible runs')
+    return parser.parse_args()
+
+
+def main():
+    def emit(text, start_time=time.time()):
+        elapsed = round((time.time() - start_time), 1)
+        print('[{:>4.1f}s] {}'.format(elapsed, text))
+
+    args = parse_arguments()
+    if args.sqlite is not None:
+        engine = connect_sqlite(args.sqlite)
+    else:
+        engine = connect('smallville')
+    params = seed_json('business')
+    with engine.begin() as connection:
+        emit('Loading people, employment and companies ..')
+        simulation = Simulation.load(
+            connection, params['salary_bands'], params['hiring_slowdown'],
+            date=args.start, seed=args.seed)
+        for _year in range(args.years):
+            simulation.tick()
+            employed = (simulation.employer >= 0).sum()
+            emit(f'  {simulation.date}: {employed} people employed')
+        emit('Writing changes ..')
+        for change, count in simulation.write_back(connection).items():
+            emit(f'  Contracts {change.replace("_", " ")}: {count}')
+        emit('Refreshing statistics ..')
+        refresh_statistics(connection)
+    emit('All done!')
+
+
+if __name__ == '__main__':
+    main()
@@ -21,9 +21,13 @@ setup(
     license='BSD',
     url='https://github.com/edelooff/smallville',
     packages=find_packages(),
+    python_requires='>=3.7',
     install_requires=[
-        'sqlalchemy',
+        'sqlalchemy >= 1.4, < 2.0',
         'psycopg2-binary'],
+    extras_require={
+        'async': ['sqlalchemy[asyncio]', 'aiosqlite', 'asyncpg'],
+        'numpy': ['numpy']},
     zip_safe=False,
     classifiers=[
         'Development Status :: 4 - Beta',
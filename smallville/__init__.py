@@ -1,9 +1,37 @@
-from . models import (
-    City,
-    Company,
-    Employment,
-    Person,
-    TransportLink)
-from . pathfinding import (
-    construct_path,
-    dijkstra)
+"""SQLAlchemy models and tools to create and simulate a small community.
+
+Package exports are imported lazily from their submodules on first access.
+This keeps light-weight modules such as `smallville.queues` and
+`smallville.pathfinding` free of the cost of importing SQLAlchemy and
+configuring the models, unless those are actually used.
+"""
+
+import importlib
+
+_EXPORTS = {
+    'City': 'models',
+    'Company': 'models',
+    'Employment': 'models',
+    'Person': 'models',
+    'TransportLink': 'models',
+    'load_network': 'models',
+    'construct_path': 'pathfinding',
+    'dijkstra': 'pathfinding'}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    """Imports the requested export from its submodule and caches it."""
+    try:
+        module_name = _EXPORTS[name]
+    except KeyError:
+        raise AttributeError(
+            f'module {__name__!r} has no attribute {name!r}') from None
+    value = getattr(importlib.import_module(f'.{module_name}', __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,177 @@
+"""Asyncio interface to the SmallVille models, using SQLAlchemy's async engine.
+
+Database drivers are chosen by URL, as for the regular engine. URLs without
+an explicit driver use `asyncpg` for PostgreSQL and `aiosqlite` for SQLite,
+which are installed with `pip install -e .[async]`.
+
+A single connection or session runs one statement at a time. To keep many
+queries in flight, give each its own connection from the engine's pool, as
+`run_concurrently` does.
+"""
+
+import asyncio
+
+from sqlalchemy import (
+    select,
+    union_all)
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.ext.asyncio import (
+    AsyncSession,
+    create_async_engine as _create_async_engine)
+from sqlalchemy.orm import sessionmaker
+
+from . bulk import AsyncBulkSaver  # noqa
+from . connection import (
+    database_url,
+    discard_connections_after_fork,
+    engine_options)
+from . models import (
+    City,
+    Company,
+    Employment,
+    Person,
+    TransportLink)
+from . records import (
+    payroll_by_company,
+    record_type)
+
+ASYNC_DRIVERS = {'postgresql': 'asyncpg', 'sqlite': 'aiosqlite'}
+
+
+def create_async_engine(
+        url=None,
+        pool_size=5,
+        max_overflow=10,
+        pool_recycle=3600,
+        pool_timeout=30,
+        pre_ping=True,
+        statement_cache_size=500,
+        **kwds):
+    """Returns an async database engine, pooled as by `create_engine`.
+
+    The options are those of `smallville.connection.create_engine`, and
+    pooled connections are likewise not shared across processes. Statements
+    run through `stream` always use server-side cursors (where supported).
+    """
+    url = make_url(url or database_url())
+    if url.drivername in ASYNC_DRIVERS:
+        driver = ASYNC_DRIVERS[url.drivername]
+        url = url.set(drivername=f'{url.drivername}+{driver}')
+    engine = _create_async_engine(url, **engine_options(
+        url, pool_size, max_overflow, pool_recycle, pool_timeout, pre_ping,
+        statement_cache_size, **kwds))
+    discard_connections_after_fork(engine.sync_engine)
+    return engine
+
+
+def async_sessionmaker(engine, **kwds):
+    """Returns a factory for async sessions bound to the engine.
+
+    Sessions do not expire their objects on commit, as reloading expired
+    attributes requires an explicit await, rather than attribute access.
+    """
+    kwds.setdefault('expire_on_commit', False)
+    return sessionmaker(bind=engine, class_=AsyncSession, **kwds)
+
+
+async def run_concurrently(engine, *queries, limit=5):
+    """Runs queries concurrently, each on its own connection from the engine.
+
+    Every query is a coroutine function taking a connection as its only
+    argument, e.g. `functools.partial(employers, person_id=1)`. Returns the
+    results of the queries, in order. At most `limit` queries are in flight
+    at once. Keep this within the size of the engine's connection pool (plus
+    overflow), as queries waiting for a connection fail after its timeout.
+    """
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(query):
+        async with semaphore:
+            async with engine.connect() as connection:
+                return await query(connection)
+
+    return await asyncio.gather(*map(run, queries))
+
+
+# #############################################################################
+# Streaming reads
+#
+async def records(connection, statement, chunk_size=10000):
+    """Yields read-only records for the rows of a SELECT statement.
+
+    This is the async equivalent of `smallville.records.records`, and works
+    on an AsyncConnection or AsyncSession. Rows are fetched in chunks of
+    `chunk_size` from a server-side cursor (where supported).
+    """
+    result = await connection.stream(statement)
+    record = record_type(*result.keys())
+    async for rows in result.partitions(chunk_size):
+        for row in rows:
+            yield record._make(row)
+
+
+async def unemployed_people(session, chunk_size=500):
+    """Yields Person objects for people without an employer (Company).
+
+    People are loaded in chunks of `chunk_size` from a server-side cursor,
+    and added to the session's identity map as they are yielded.
+    """
+    employment = select([Employment.person_id]).where(
+        Employment.person_id == Person.id)
+    statement = select([Person]).where(~employment.exists())
+    result = await session.stream(
+        statement.execution_options(yield_per=chunk_size))
+    async for person in result.scalars():
+        yield person
+
+
+# #############################################################################
+# Lookups for single people, cities and companies
+#
+async def employers(connection, person_id):
+    """Returns records of the companies a person works for, with salary."""
+    statement = select([
+        Company.id.label('company_id'),
+        Company.name,
+        Employment.role,
+        Employment.salary,
+    ]).select_from(
+        Employment.__table__.join(Company.__table__)
+    ).where(Employment.person_id == person_id).order_by(Company.id)
+    return await _fetch_records(connection, statement)
+
+
+async def neighbours(connection, city_id):
+    """Returns records of the cities linked to a city, nearest first."""
+    link = TransportLink.__table__
+    linked = union_all(*(
+        select([
+            other.label('city_id'),
+            link.c.distance,
+        ]).where(this == city_id)
+        for this, other in [
+            (link.c.lower_city_id, link.c.higher_city_id),
+            (link.c.higher_city_id, link.c.lower_city_id)])
+    ).subquery('linked')
+    statement = select([
+        linked.c.city_id,
+        City.name,
+        linked.c.distance,
+    ]).select_from(
+        linked.join(City.__table__, City.id == linked.c.city_id)
+    ).order_by(linked.c.distance, linked.c.city_id)
+    return await _fetch_records(connection, statement)
+
+
+async def payroll(connection, company_id):
+    """Returns a record of a company's headcount and payroll, or None."""
+    statement = payroll_by_company().where(Company.id == company_id)
+    rows = await _fetch_records(connection, statement)
+    return rows[0] if rows else None
+
+
+async def _fetch_records(connection, statement):
+    """Returns a list of records for all rows of a SELECT statement."""
+    result = await connection.execute(statement)
+    record = record_type(*result.keys())
+    return [record._make(row) for row in result]
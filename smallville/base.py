@@ -1,13 +1,19 @@
 import re
+import time
 
 from sqlalchemy import inspect
 from sqlalchemy.ext.declarative import (
     as_declarative,
     declared_attr)
+from sqlalchemy.sql.ddl import (
+    AddConstraint,
+    CreateIndex,
+    CreateTable)
 from sqlalchemy.sql.schema import (
     Column,
     ForeignKey,
     MetaData)
+from sqlalchemy.sql.sqltypes import SchemaType
 
 
 # #############################################################################
@@ -24,9 +30,8 @@ def metadata():
     return MetaData(naming_convention=naming_convention)
 
 
-@as_declarative(metadata=metadata())
-class Base:
-    """Extended SQLAlchemy declarative base class."""
+class ModelBase:
+    """Table naming and representation conventions for declarative bases."""
     @declared_attr
     def __tablename__(cls):
         """Returns a table name with words separated by underscores."""
@@ -49,6 +54,11 @@ class Base:
         return f'<{model_name} [{identity}]>'
 
 
+@as_declarative(metadata=metadata())
+class Base(ModelBase):
+    """Extended SQLAlchemy declarative base class."""
+
+
 # #############################################################################
 # column definition utility functions
 #
@@ -63,3 +73,53 @@ def foreign_key(reference, onupdate='CASCADE', ondelete='CASCADE', **kwds):
     foreign_key = ForeignKey(reference, onupdate=onupdate, ondelete=ondelete)
     kwds.setdefault('index', True)
     return column(foreign_key, **kwds)
+
+
+# #############################################################################
+# Deferred schema creation for bulk loading
+#
+def create_tables_deferred(bind, metadata=None):
+    """Creates all tables without secondary indexes or foreign keys.
+
+    Primary keys, unique and check constraints are created as part of the
+    table, as are any schema-level types (such as PostgreSQL enum types) that
+    the columns depend on. Secondary indexes and foreign key constraints are
+    left for `build_deferred_schema`, to be created after loading the data.
+
+    Dialects that cannot add constraints to existing tables (SQLite) will
+    have their foreign keys created with the tables.
+    """
+    if metadata is None:
+        metadata = Base.metadata
+    foreign_keys = () if bind.dialect.supports_alter else None
+    for table in metadata.sorted_tables:
+        for column in table.columns:
+            if isinstance(column.type, SchemaType):
+                column.type.create(bind, checkfirst=True)
+        bind.execute(CreateTable(
+            table, include_foreign_key_constraints=foreign_keys))
+
+
+def build_deferred_schema(bind, metadata=None):
+    """Builds the indexes and foreign keys left out by create_tables_deferred.
+
+    All indexes are built before the foreign key constraints, so that the
+    constraint validation can make use of them. This yields a 2-tuple of the
+    name of each index or constraint and the time (in seconds) it took to
+    build, after it has been built.
+    """
+    if metadata is None:
+        metadata = Base.metadata
+    elements = []
+    for table in metadata.sorted_tables:
+        elements.extend(CreateIndex(index) for index in sorted(
+            table.indexes, key=lambda index: index.name))
+    if bind.dialect.supports_alter:
+        for table in metadata.sorted_tables:
+            elements.extend(map(AddConstraint, sorted(
+                table.foreign_key_constraints,
+                key=lambda constraint: constraint.name)))
+    for ddl in elements:
+        start_time = time.perf_counter()
+        bind.execute(ddl)
+        yield ddl.element.name, time.perf_counter() - start_time
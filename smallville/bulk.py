@@ -0,0 +1,118 @@
+import time
+
+
+class _BulkBuffer:
+    """Pending objects and mappings of a bulk saver, by mapped class."""
+    def __init__(self, session, *mappings, threshold=2000):
+        self.session = session
+        self.mappings = mappings
+        self.threshold = threshold
+        self._objects = {mapping: [] for mapping in mappings}
+        self._mappings = {mapping: [] for mapping in mappings}
+        self._pending = 0
+
+    def _add_mapping(self, type_, mapping):
+        """Adds a type+mapping, unless `None`. Returns whether to flush."""
+        if mapping is not None:
+            self._mappings[type_].append(mapping)
+            self._pending += 1
+        return self._pending >= self.threshold
+
+    def _add_object(self, obj):
+        """Adds an object, unless `None`. Returns whether to flush."""
+        if obj is not None:
+            self._objects[type(obj)].append(obj)
+            self._pending += 1
+        return self._pending >= self.threshold
+
+    def _save(self, session):
+        """Bulk-saves pending objects using a (synchronous) session."""
+        for mapping in self.mappings:
+            session.bulk_insert_mappings(mapping, self._mappings[mapping])
+            self._mappings[mapping] = []
+            session.bulk_save_objects(self._objects.pop(mapping))
+            self._objects[mapping] = []
+
+    def _record_flush(self, start_time):
+        """Reports the flush to the session's metrics, resets pending count."""
+        metrics = self.session.info.get('metrics')
+        if metrics is not None and self._pending:
+            metrics.record_flush(
+                self._pending, time.perf_counter() - start_time)
+        self._pending = 0
+
+
+class BulkSaver(_BulkBuffer):
+    """Chunked bulk insert/update utility.
+
+    This provides a wrapper around SQLAlchemy's Session.bulk_save_objects,
+    providing both grouping of inserts by their mapped class, as well as
+    chunked inserts based on a configurable threshold.
+
+    A flush is triggered once the number of pending objects meets the threshold
+    value. The inserts are then performed in the order of the mappings as
+    provided on initiation of the BulkSaver. This allows non-cyclical
+    foreign keys to resolve correctly (provided the Mapping order is correct.)
+
+    When the session's `info` dictionary contains a 'metrics' entry (such as
+    a SeedMetrics instance), every flush reports its row count and duration
+    to that object's `record_flush` method.
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        if type is None:
+            self.flush()
+
+    def add_mapping(self, type_, mapping):
+        """Adds a type+mapping to the collection, or nothing when `None`.
+
+        Automatically flushes all pending objects when threshold is reached.
+        """
+        if self._add_mapping(type_, mapping):
+            self.flush()
+
+    def add_object(self, obj):
+        """Adds an object to the pending collection, or nothing when `None`.
+
+        Automatically flushes all pending objects when threshold is reached.
+        """
+        if self._add_object(obj):
+            self.flush()
+
+    def flush(self):
+        """Bulk-saves objects to the database, in mapping order."""
+        start_time = time.perf_counter()
+        self._save(self.session)
+        self._record_flush(start_time)
+
+
+class AsyncBulkSaver(_BulkBuffer):
+    """The BulkSaver for an AsyncSession, used as an async context manager.
+
+    As adding may trigger a flush, `add_mapping` and `add_object` are
+    coroutines. Flushes run the bulk saves in the session's worker context.
+    """
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, type, value, traceback):
+        if type is None:
+            await self.flush()
+
+    async def add_mapping(self, type_, mapping):
+        """Adds a type+mapping to the collection, or nothing when `None`."""
+        if self._add_mapping(type_, mapping):
+            await self.flush()
+
+    async def add_object(self, obj):
+        """Adds an object to the pending collection, or nothing when `None`."""
+        if self._add_object(obj):
+            await self.flush()
+
+    async def flush(self):
+        """Bulk-saves objects to the database, in mapping order."""
+        start_time = time.perf_counter()
+        await self.session.run_sync(self._save)
+        self._record_flush(start_time)
@@ -0,0 +1,280 @@
+from sqlalchemy import (
+    Column,
+    event,
+    func,
+    inspect,
+    select,
+    sql)
+from sqlalchemy.ext.declarative import as_declarative
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import (
+    object_session,
+    relationship)
+from sqlalchemy.sql.ddl import AddConstraint
+from sqlalchemy.sql.sqltypes import (
+    Date,
+    Enum,
+    Integer,
+    SmallInteger,
+    Text)
+
+from . import models
+from . base import (
+    ModelBase,
+    column,
+    foreign_key,
+    metadata)
+
+ENCODED_TABLES = 'person', 'company'
+
+# SQLite only assigns keys to INTEGER primary keys, and stores them compactly
+LOOKUP_KEY = SmallInteger().with_variant(Integer, 'sqlite')
+
+
+@as_declarative(metadata=metadata())
+class CompactBase(ModelBase):
+    """Declarative base for the schema with dictionary encoded names.
+
+    In this schema, the names of people and the industries of companies are
+    stored as small integer keys into lookup tables, rather than as text.
+    All other tables are identical to the regular schema, and are copied
+    into this metadata, so that it describes the complete database.
+    """
+
+
+for _table in models.Base.metadata.sorted_tables:
+    if _table.name not in ENCODED_TABLES:
+        _table.to_metadata(CompactBase.metadata)
+
+
+# #############################################################################
+# Lookup tables
+#
+class Lookup:
+    """Columns and retrieval of a lookup table of unique names."""
+    __repr_args__ = 'name',
+
+    id = column(LOOKUP_KEY, primary_key=True)
+    name = column(Text, unique=True)
+
+    @classmethod
+    def lookup(cls, session, name):
+        """Returns the lookup entry for a name, creating it when missing.
+
+        Entries are cached on the session, so that names that are looked up
+        repeatedly (before they are flushed) share a single entry.
+        """
+        cache = session.info.setdefault(('lookup', cls), {})
+        if name not in cache:
+            entry = session.query(cls).filter_by(name=name).one_or_none()
+            if entry is None:
+                entry = cls(name=name)
+                session.add(entry)
+            cache[name] = entry
+        return cache[name]
+
+    @classmethod
+    def key(cls, connection, name):
+        """Returns the key for a name, inserting a lookup entry when missing.
+
+        This works on the connection rather than a session, and can be used
+        while the session is flushing.
+        """
+        table = cls.__table__
+        key = connection.scalar(select([table.c.id]).where(
+            table.c.name == name))
+        if key is None:
+            key, = connection.execute(
+                table.insert().values(name=name)).inserted_primary_key
+        return key
+
+
+class FirstName(Lookup, CompactBase):
+    pass
+
+
+class LastName(Lookup, CompactBase):
+    pass
+
+
+class Industry(Lookup, CompactBase):
+    pass
+
+
+def lookup_property(lookup, relation, key):
+    """Returns a hybrid property for the name a lookup key refers to.
+
+    On instances, the name is read from (and assigned to) the `relation` to
+    the lookup model. The lookup entry for an assigned name is found or
+    created in the object's session. Names assigned to new objects outside of
+    a session are kept on the object, and resolved when it is inserted.
+    Detached objects must be added to a session before assigning names.
+
+    In queries, the name is selected using a correlated subquery on the `key`
+    column. When selecting only encoded names, use `select_from` to provide
+    the model's table, e.g. `session.query(Person.last_name).select_from(
+    Person)`.
+    """
+    def getter(self):
+        pending = vars(self).get('_pending_names', {})
+        if relation in pending:
+            return pending[relation][2]
+        entry = getattr(self, relation)
+        return None if entry is None else entry.name
+
+    def setter(self, name):
+        session = object_session(self)
+        if session is not None:
+            vars(self).get('_pending_names', {}).pop(relation, None)
+            setattr(self, relation, lookup.lookup(session, name))
+        elif inspect(self).detached:
+            raise ValueError(
+                f'Detached {type(self).__name__} must be added to a session '
+                f'before assigning an encoded name')
+        else:
+            pending = vars(self).setdefault('_pending_names', {})
+            pending[relation] = lookup, key, name
+
+    def expression(cls):
+        return select([lookup.name]).where(
+            lookup.id == getattr(cls, key)
+        ).correlate_except(lookup).scalar_subquery()
+
+    return hybrid_property(getter, setter, expr=expression)
+
+
+# #############################################################################
+# Models with encoded names
+#
+class Company(CompactBase):
+    __repr_args__ = 'name', 'industry'
+
+    # Column definition
+    id = column(Integer, primary_key=True)
+    name = column(Text)
+    industry_id = foreign_key('industry.id', ondelete='RESTRICT', index=False)
+    city_id = foreign_key('city.id')
+
+    # Relationships and encoded names
+    _industry = relationship(Industry, lazy='joined', innerjoin=True)
+    industry = lookup_property(Industry, '_industry', 'industry_id')
+
+
+class Person(CompactBase):
+    __repr_args__ = 'first_name', 'last_name', 'gender'
+
+    # Column definition
+    id = column(Integer, primary_key=True)
+    first_name_id = foreign_key(
+        'first_name.id', ondelete='RESTRICT', index=False)
+    last_name_id = foreign_key(
+        'last_name.id', ondelete='RESTRICT', index=False)
+    birthday = column(Date)
+    gender = column(Enum('f', 'm', 'x', name='ck_gender_type'))
+    city_id = foreign_key('city.id')
+    self_employment_income = column(Integer, nullable=True)
+
+    # Relationships and encoded names
+    _first_name = relationship(FirstName, lazy='joined', innerjoin=True)
+    _last_name = relationship(LastName, lazy='joined', innerjoin=True)
+    first_name = lookup_property(FirstName, '_first_name', 'first_name_id')
+    last_name = lookup_property(LastName, '_last_name', 'last_name_id')
+
+
+# Text columns of the regular schema, with the lookup that replaces them
+ENCODED_COLUMNS = [
+    (Person, 'first_name', FirstName),
+    (Person, 'last_name', LastName),
+    (Company, 'industry', Industry)]
+
+# Compact models of the tables with encoded names in the regular schema
+_DECODED_MODELS = {
+    models.Person.__table__: Person,
+    models.Company.__table__: Company}
+
+
+@event.listens_for(Company, 'before_insert')
+@event.listens_for(Person, 'before_insert')
+def _resolve_pending_names(_mapper, connection, target):
+    """Assigns keys for names given to the object outside of a session."""
+    for lookup, key, name in vars(target).pop(
+            '_pending_names', {}).values():
+        setattr(target, key, lookup.key(connection, name))
+
+
+# #############################################################################
+# Queries on the compact schema
+#
+def is_compact(connection):
+    """Returns whether the database has been converted to this schema."""
+    return inspect(connection).has_table(Industry.__tablename__)
+
+
+def decode(clause):
+    """Returns a copy of a clause on the regular schema, for this schema.
+
+    Columns of the regular Person and Company tables are replaced by those of
+    the compact tables, and encoded columns by the expression selecting the
+    name from their lookup table. This allows statements and criteria built
+    from the regular models to be used on a converted database.
+    """
+    def replace(element):
+        if isinstance(element, Column):
+            model = _DECODED_MODELS.get(element.table)
+            if model is None:
+                return None
+            if element.name in model.__table__.c:
+                return model.__table__.c[element.name]
+            return getattr(model, element.name).label(element.name)
+        return None
+
+    return sql.visitors.replacement_traverse(clause, {}, replace)
+
+
+# #############################################################################
+# Conversion from the regular schema
+#
+def encode_names(connection):
+    """Converts a database from the regular to the compact schema, in place.
+
+    For every encoded column, the lookup table is created and filled with
+    the distinct names in the column. A key column is then added, filled
+    with the key of each row's name, after which the text column is dropped.
+    Returns a dictionary with the number of distinct names in each column.
+
+    On PostgreSQL, the key columns are made NOT NULL and given foreign key
+    constraints. SQLite cannot add constraints to existing tables, so there
+    the key columns remain nullable and unconstrained.
+
+    The space taken up by the dropped columns is only reclaimed by a VACUUM
+    (a VACUUM FULL on PostgreSQL), which cannot run inside a transaction.
+    """
+    name_counts = {}
+    preparer = connection.dialect.identifier_preparer
+    for model, name, lookup in ENCODED_COLUMNS:
+        table = preparer.format_table(model.__table__)
+        key = model.__table__.c[f'{name}_id']
+        # The table during conversion, holding both the name and its key
+        converting = sql.table(
+            model.__tablename__, sql.column(name), sql.column(key.name))
+        lookup.__table__.create(connection)
+        connection.execute(lookup.__table__.insert().from_select(
+            ['name'], select([converting.c[name]]).distinct()))
+        connection.execute(
+            f'ALTER TABLE {table} ADD COLUMN {preparer.format_column(key)} '
+            f'{key.type.compile(dialect=connection.dialect)}')
+        connection.execute(converting.update().values({
+            key.name: select([lookup.id]).where(
+                lookup.name == converting.c[name]).scalar_subquery()}))
+        connection.execute(
+            f'ALTER TABLE {table} DROP COLUMN {preparer.quote(name)}')
+        if connection.dialect.supports_alter:
+            connection.execute(
+                f'ALTER TABLE {table} ALTER COLUMN '
+                f'{preparer.format_column(key)} SET NOT NULL')
+            for constraint in key.table.foreign_key_constraints:
+                if key in constraint.columns.values():
+                    connection.execute(AddConstraint(constraint))
+        name_counts[name] = connection.scalar(
+            select([func.count()]).select_from(lookup.__table__))
+    return name_counts
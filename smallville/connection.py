@@ -0,0 +1,158 @@
+import getpass
+import os
+
+import sqlalchemy
+from sqlalchemy import (
+    event,
+    exc)
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.orm import sessionmaker
+
+
+def database_url(database='smallville', user=None, host=''):
+    """Returns a PostgreSQL connection URL for the given database.
+
+    The user name defaults to that of the current process user, and the host
+    to a local socket connection.
+    """
+    if user is None:
+        user = getpass.getuser()
+    return f'postgresql://{user}@{host}/{database}'
+
+
+def create_engine(
+        url=None,
+        pool_size=5,
+        max_overflow=10,
+        pool_recycle=3600,
+        pool_timeout=30,
+        pre_ping=True,
+        statement_cache_size=500,
+        stream_results=False,
+        **kwds):
+    """Returns a database engine with pooling suitable for long-running use.
+
+    `url`: the database URL; defaults to the local `smallville` database.
+    `pool_size`, `max_overflow`, `pool_recycle` and `pool_timeout`: connection
+        pool sizing and lifetime, ignored for SQLite which uses its own pools
+    `pre_ping`: test connections for liveness when they are checked out
+    `statement_cache_size`: number of compiled SQL statements to cache
+    `stream_results`: default to server-side cursors for all statements;
+        this should only be enabled for engines used for large reads
+
+    Pooled connections are never shared across processes: connections that
+    were inherited from a parent process are discarded on checkout, and new
+    ones are opened in their place. Remaining keywords are passed on to
+    SQLAlchemy's `create_engine`.
+    """
+    url = make_url(url or database_url())
+    engine = sqlalchemy.create_engine(url, **engine_options(
+        url, pool_size, max_overflow, pool_recycle, pool_timeout, pre_ping,
+        statement_cache_size, **kwds))
+    discard_connections_after_fork(engine)
+    if stream_results:
+        engine = engine.execution_options(stream_results=True)
+    return engine
+
+
+def engine_options(
+        url,
+        pool_size,
+        max_overflow,
+        pool_recycle,
+        pool_timeout,
+        pre_ping,
+        statement_cache_size,
+        **kwds):
+    """Returns keyword arguments for creating an engine for the URL.
+
+    Pool sizing options are left out for SQLite, which uses its own pools,
+    unless a `poolclass` is given.
+    """
+    kwds.update(pool_pre_ping=pre_ping, query_cache_size=statement_cache_size)
+    if url.get_backend_name() != 'sqlite' or 'poolclass' in kwds:
+        kwds.update(
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_recycle=pool_recycle,
+            pool_timeout=pool_timeout)
+    return kwds
+
+
+def sqlite_bulk_load(engine, cache_size_mb=512):
+    """Configures all new connections of a SQLite engine for bulk loading.
+
+    Durability is traded for speed: the journal is kept in write-ahead mode,
+    syncing to disk is disabled and a large page cache (`cache_size_mb`) is
+    used, with temporary storage kept in memory. Returns the engine.
+    """
+    @event.listens_for(engine, 'connect')
+    def bulk_load_pragmas(dbapi_connection, _connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode = WAL')
+        cursor.execute('PRAGMA synchronous = OFF')
+        cursor.execute(f'PRAGMA cache_size = -{cache_size_mb * 1024}')
+        cursor.execute('PRAGMA temp_store = MEMORY')
+        cursor.close()
+
+    return engine
+
+
+def discard_connections_after_fork(engine):
+    """Invalidates pooled connections that were opened by another process.
+
+    This follows the approach from the SQLAlchemy pooling documentation: the
+    process id is recorded on connect, and compared on checkout. A mismatch
+    causes the connection to be discarded (without closing the parent's
+    connection) and the pool to retry with a new connection.
+    """
+    @event.listens_for(engine, 'connect')
+    def record_pid(_dbapi_connection, connection_record):
+        connection_record.info['pid'] = os.getpid()
+
+    @event.listens_for(engine, 'checkout')
+    def check_pid(_dbapi_connection, connection_record, connection_proxy):
+        if connection_record.info['pid'] != os.getpid():
+            connection_record.dbapi_connection = None
+            connection_proxy.dbapi_connection = None
+            raise exc.DisconnectionError(
+                'Connection belongs to another process, reconnecting')
+
+
+# #############################################################################
+# Session factories
+#
+def bulk_sessionmaker(engine, **kwds):
+    """Returns a session factory suited to bulk inserts and updates.
+
+    Sessions do not autoflush, nor expire their objects on commit, so that
+    objects kept around for seeding do not trigger reloads or flushes while
+    bulk operations are taking place.
+    """
+    kwds.setdefault('autoflush', False)
+    kwds.setdefault('expire_on_commit', False)
+    return sessionmaker(bind=engine, **kwds)
+
+
+def readonly_sessionmaker(engine, **kwds):
+    """Returns a session factory suited to (large) read-only workloads.
+
+    Sessions use server-side cursors (where supported), PostgreSQL read-only
+    transactions, and refuse to flush any changes made to their objects.
+    """
+    options = {'stream_results': True}
+    if engine.dialect.name == 'postgresql':
+        options['postgresql_readonly'] = True
+    kwds.setdefault('autoflush', False)
+    kwds.setdefault('expire_on_commit', False)
+    factory = sessionmaker(bind=engine.execution_options(**options), **kwds)
+    event.listen(factory, 'before_flush', _refuse_flush)
+    return factory
+
+
+# #############################################################################
+# Private helper functions
+#
+def _refuse_flush(session, _flush_context, _instances):
+    """Raises an error when a read-only session attempts to flush changes."""
+    raise exc.InvalidRequestError('Cannot flush changes in read-only session')
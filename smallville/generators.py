@@ -55,6 +55,21 @@ class CompanyGenerator:
         return ' '.join(map(random.choice, name_parts))
 
 
+# Roles of employees, and the percentiles at which managers and directors start
+ROLES = 'worker', 'manager', 'director'
+ROLE_PERCENTILES = 0.85, 0.9
+
+
+def role_salaries(first, second):
+    """Returns the salary for each of the ROLES, given two salary offers.
+
+    Workers take the first offer, managers the best of both and directors
+    their sum. The offers can be numbers, or numpy arrays of them.
+    """
+    best = (first + second + abs(first - second)) / 2
+    return first, best, first + second
+
+
 class PopulationGenerator:
     BIRTHDATE_RANGE = datetime.date(1980, 1, 1), datetime.date(1998, 1, 1)
 
@@ -150,6 +165,29 @@ def city_generator(population_ranges, company_density_range):
     return _generator
 
 
+def synthetic_cities(names, size_weights, count):
+    """Yields `count` (name, size) pairs to synthesize a world of any size.
+
+    `names`: a sequence of city names to draw from, in order. Once exhausted,
+        the names are reused with an ordinal suffix to keep them unique, e.g.
+        with 80 names, the 81st city is named after the first with a suffix
+        of 2, as in 'Aalsmeer 2'.
+    `size_weights`: a dict of relative frequencies mapped to the city size
+        code. The size for each city is drawn independently at random.
+
+    Only the given names are kept in memory, making this suitable to stream
+    worlds of tens of thousands of cities.
+    """
+    names = list(names)
+    size_codes, weights = zip(*size_weights.items())
+    for index in range(count):
+        cycle, position = divmod(index, len(names))
+        name = names[position]
+        if cycle:
+            name = f'{name} {cycle + 1}'
+        yield name, random.choices(size_codes, weights)[0]
+
+
 def pick_member(collection):
     """Applies the Central Limit Theorem to random index picking.
 
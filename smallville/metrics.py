@@ -0,0 +1,125 @@
+import contextlib
+import json
+import resource
+import sys
+import time
+import tracemalloc
+
+
+class StageMetrics:
+    """Timing, throughput and memory measurements for a single named stage.
+
+    Rows are counted either explicitly (by adding to `rows`) or implicitly by
+    recording bulk flushes through `record_flush`. Timing and memory fields
+    are filled in when the stage completes.
+    """
+    __slots__ = (
+        'name', 'rows', 'flushes', 'flush_time', 'flush_time_max',
+        'wall_time', 'cpu_time', 'process_peak_rss_kb',
+        'peak_traced_bytes')
+
+    def __init__(self, name):
+        self.name = name
+        self.rows = 0
+        self.flushes = 0
+        self.flush_time = 0.0
+        self.flush_time_max = 0.0
+        self.wall_time = None
+        self.cpu_time = None
+        self.process_peak_rss_kb = None
+        self.peak_traced_bytes = None
+
+    def __repr__(self):
+        return f'<StageMetrics {self.name!r}: {self.rows} rows>'
+
+    def as_dict(self):
+        """Returns the stage metrics as a JSON-serializable dictionary."""
+        record = {'stage': self.name}
+        for attr in self.__slots__[1:]:
+            record[attr] = getattr(self, attr)
+        record['rows_per_second'] = record['flush_time_mean'] = None
+        if self.wall_time:
+            record['rows_per_second'] = round(self.rows / self.wall_time, 1)
+        if self.flushes:
+            record['flush_time_mean'] = self.flush_time / self.flushes
+        return record
+
+    def record_flush(self, rows, duration):
+        """Records a bulk flush of a number of rows, taking `duration` secs."""
+        self.rows += rows
+        self.flushes += 1
+        self.flush_time += duration
+        self.flush_time_max = max(self.flush_time_max, duration)
+
+
+class SeedMetrics:
+    """Collects per-stage metrics and writes them out as JSON lines.
+
+    Each stage is measured using the `stage` context manager, which records
+    wall and CPU time, and the peak resident set size of the process at the
+    end of the stage. This is the peak over the lifetime of the process, not
+    that of the stage alone, and is recorded as `process_peak_rss_kb`. When
+    `trace_memory` is enabled, `tracemalloc` is used to also record the peak
+    of Python allocations during each stage. This gives a more precise
+    picture, at a significant cost in execution speed.
+
+    Bulk flushes are attributed to the currently running stage, if any.
+    """
+    def __init__(self, stream=None, trace_memory=False):
+        self.stream = stream
+        self.trace_memory = trace_memory
+        self.stages = []
+        self.current = None
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Measures the enclosed block as a stage, yields a StageMetrics."""
+        stage = self.current = StageMetrics(name)
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            _reset_traced_peak()
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            yield stage
+        finally:
+            stage.wall_time = time.perf_counter() - wall_start
+            stage.cpu_time = time.process_time() - cpu_start
+            stage.process_peak_rss_kb = peak_rss_kb()
+            if self.trace_memory:
+                stage.peak_traced_bytes = tracemalloc.get_traced_memory()[1]
+            self.current = None
+            self.stages.append(stage)
+            self.write(stage.as_dict())
+
+    def record_flush(self, rows, duration):
+        """Records a bulk flush against the currently running stage."""
+        if self.current is not None:
+            self.current.record_flush(rows, duration)
+
+    def write(self, record):
+        """Writes a record as a single JSON line to the output stream."""
+        if self.stream is not None:
+            self.stream.write(json.dumps(record) + '\n')
+            self.stream.flush()
+
+
+def peak_rss_kb():
+    """Returns the peak resident set size of the current process in KiB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return peak // 1024  # reported in bytes rather than kilobytes
+    return peak
+
+
+def _reset_traced_peak():
+    """Resets the peak of traced memory to the currently traced size.
+
+    `tracemalloc.reset_peak` is only available from Python 3.9. On earlier
+    versions the traces are cleared instead, which discards the traces of
+    earlier allocations, so the peak covers only allocations made afterwards.
+    """
+    if hasattr(tracemalloc, 'reset_peak'):
+        tracemalloc.reset_peak()
+    else:
+        tracemalloc.clear_traces()
@@ -1,7 +1,14 @@
+from collections import defaultdict
 from itertools import chain
 
+from sqlalchemy import (
+    event,
+    func)
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import relationship
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlalchemy.sql.sqltypes import (
+    BigInteger,
     Integer,
     Date,
     Enum,
@@ -12,6 +19,9 @@ from . base import (
     column,
     foreign_key)
 
+# Shared between City and IndustryStatistics, for a single database type
+CITY_SIZE_CODES = Enum('S', 'M', 'L', 'XL', name='ck_city_size_type')
+
 
 # #############################################################################
 # Models
@@ -22,7 +32,7 @@ class City(Base):
     # Column definition
     id = column(Integer, primary_key=True)
     name = column(Text, unique=True)
-    size_code = column(Enum('S', 'M', 'L', 'XL', name='ck_city_size_type'))
+    size_code = column(CITY_SIZE_CODES)
 
     # Relationships
     citizens = relationship('Person', back_populates='city')
@@ -36,13 +46,24 @@ class City(Base):
         back_populates='higher_city',
         foreign_keys='TransportLink.higher_city_id')
 
+    # Cached adjacency mapping, cleared when links change (see events below)
+    _adjacency = None
+
     @property
     def transport_links(self):
-        """Mapping of all transport links and associated costs."""
+        """Mapping of all transport links and associated costs.
+
+        The mapping is built once and then cached on the instance. The cache
+        is cleared whenever one of the link collections changes, the distance
+        of one of the links is updated, or the city is expired or refreshed.
+        """
         def link_getter(relative):
             for link in getattr(self, f'_links_{relative}'):
                 yield getattr(link, f'{relative}_city'), link.distance
-        return dict(chain(link_getter('higher'), link_getter('lower')))
+        if self._adjacency is None:
+            self._adjacency = dict(
+                chain(link_getter('higher'), link_getter('lower')))
+        return self._adjacency
 
 
 class Company(Base):
@@ -68,6 +89,8 @@ class Employment(Base):
     company_id = foreign_key('company.id', primary_key=True)
     role = column(Enum('director', 'manager', 'worker', name='ck_role_type'))
     salary = column(Integer)
+    # Network distance from home to work city, see refresh_commute_distances
+    commute_distance = column(Integer, nullable=True, index=True)
 
     # Relationships
     person = relationship('Person', back_populates='employment')
@@ -113,3 +136,147 @@ class TransportLink(Base):
         'City',
         back_populates='_links_lower',
         foreign_keys=higher_city_id)
+
+
+# #############################################################################
+# Aggregate models, see `smallville.statistics` for their maintenance
+#
+class CityStatistics(Base):
+    """Population and employment figures for a city.
+
+    Both `employed` and `commuters` count employment contracts held by the
+    residents of the city, the latter counting only those where the company
+    is located in a different city.
+    """
+    __repr_args__ = 'population', 'employed', 'commuters'
+
+    # Column definition
+    city_id = foreign_key('city.id', index=False, primary_key=True)
+    population = column(Integer, default=0)
+    employed = column(Integer, default=0)
+    commuters = column(Integer, default=0)
+
+    # Relationships
+    city = relationship('City')
+
+    @hybrid_property
+    def employment_rate(self):
+        """Share of the population that is employed."""
+        if self.population:
+            return self.employed / self.population
+
+    @employment_rate.expression
+    def employment_rate(cls):
+        return cls.employed * 1.0 / func.nullif(cls.population, 0)
+
+    @hybrid_property
+    def commuter_share(self):
+        """Share of the employed population that works in another city."""
+        if self.employed:
+            return self.commuters / self.employed
+
+    @commuter_share.expression
+    def commuter_share(cls):
+        return cls.commuters * 1.0 / func.nullif(cls.employed, 0)
+
+
+class CompanyStatistics(Base):
+    __repr_args__ = 'headcount', 'payroll'
+
+    # Column definition
+    company_id = foreign_key('company.id', index=False, primary_key=True)
+    headcount = column(Integer, default=0)
+    payroll = column(BigInteger, default=0)
+
+    # Relationships
+    company = relationship('Company')
+
+    @hybrid_property
+    def average_salary(self):
+        """Average salary of the employees of the company."""
+        if self.headcount:
+            return self.payroll / self.headcount
+
+    @average_salary.expression
+    def average_salary(cls):
+        return cls.payroll * 1.0 / func.nullif(cls.headcount, 0)
+
+
+class IndustryStatistics(Base):
+    """Employment figures per industry and size code of the company's city."""
+    __repr_args__ = 'industry', 'size_code', 'headcount', 'payroll'
+
+    # Column definition
+    industry = column(Text, primary_key=True)
+    size_code = column(CITY_SIZE_CODES, primary_key=True)
+    headcount = column(Integer, default=0)
+    payroll = column(BigInteger, default=0)
+
+    @hybrid_property
+    def average_salary(self):
+        """Average salary in the industry, for cities of this size."""
+        if self.headcount:
+            return self.payroll / self.headcount
+
+    @average_salary.expression
+    def average_salary(cls):
+        return cls.payroll * 1.0 / func.nullif(cls.headcount, 0)
+
+
+# #############################################################################
+# Network loading and adjacency cache invalidation
+#
+def load_network(session):
+    """Returns all cities, with their transport links loaded in two queries.
+
+    Cities and links are each retrieved with a single query, after which the
+    link collections of every city and the city references of every link are
+    populated directly. Using the `transport_links` of the returned cities
+    (e.g. for `dijkstra`) will then not emit any further queries.
+    """
+    cities = session.query(City).all()
+    cities_by_id = {city.id: city for city in cities}
+    links_higher, links_lower = defaultdict(list), defaultdict(list)
+    for link in session.query(TransportLink):
+        set_committed_value(
+            link, 'lower_city', cities_by_id[link.lower_city_id])
+        set_committed_value(
+            link, 'higher_city', cities_by_id[link.higher_city_id])
+        links_higher[link.lower_city_id].append(link)
+        links_lower[link.higher_city_id].append(link)
+    for city in cities:
+        set_committed_value(city, '_links_higher', links_higher[city.id])
+        set_committed_value(city, '_links_lower', links_lower[city.id])
+        city._adjacency = None
+    return cities
+
+
+def _clear_adjacency(city, *args):
+    """Clears the cached transport link mapping of a city.
+
+    Expiry during a commit may target a city that was already garbage
+    collected, in which case the listener is called with `None`.
+    """
+    if city is not None:
+        city._adjacency = None
+
+
+def _clear_link_adjacency(link, *args):
+    """Clears the cached link mapping of cities connected by a link.
+
+    The related cities are taken from the instance state, so that no queries
+    are emitted to load them. Any city that has a cached mapping including
+    this link will have loaded it, and is therefore present.
+    """
+    for relative in ('lower_city', 'higher_city'):
+        city = vars(link).get(relative)
+        if city is not None:
+            _clear_adjacency(city)
+
+
+for _collection in (City._links_higher, City._links_lower):
+    for _event in ('append', 'remove', 'bulk_replace'):
+        event.listen(_collection, _event, _clear_adjacency)
+for _event in ('expire', 'refresh'):
+    event.listen(City, _event, _clear_adjacency)
+event.listen(TransportLink.distance, 'set', _clear_link_adjacency)
@@ -0,0 +1,176 @@
+import collections
+import math
+
+import numpy
+
+NetworkEdges = collections.namedtuple(
+    'NetworkEdges', 'lower_city_id higher_city_id distance')
+
+
+class NetworkVertex:
+    """A city in a generated network, usable as a vertex for `dijkstra`."""
+    __slots__ = 'id', 'transport_links'
+
+    def __init__(self, id):
+        self.id = id
+        self.transport_links = {}
+
+    def __repr__(self):
+        return f'<NetworkVertex {self.id}>'
+
+
+def transport_network(
+        city_ids,
+        topology='chain',
+        distance_range=(10, 25),
+        seed=None,
+        **params):
+    """Returns a transport network between cities as arrays of edges.
+
+    This works on integer city ids rather than City objects, and is entirely
+    vectorised using numpy (installed with the `numpy` extra). The
+    result is a NetworkEdges tuple of three equally sized arrays: the lower
+    and higher city id of every link, and its distance. Links are unique and
+    ordered by their lower and higher city id. The following topologies are
+    available, each accepting additional keyword parameters:
+
+        - 'chain': the topology of `create_transport_network` in the seed
+            script, a number of full-circle chains through the shuffled
+            cities, based on the `max_hop_distance` (default: 3)
+        - 'geometric': cities are scattered over a square, with an area of
+            one unit per city, and linked to their `neighbours` (default: 6)
+            nearest cities. Distances are the Euclidean distance between the
+            cities, multiplied by `scale` (default: 10) and rounded up. This
+            network is not guaranteed to be connected.
+        - 'small_world': a Watts-Strogatz network, a ring of cities in the
+            given order, each linked to their `neighbours` (default: 4)
+            nearest cities on the ring, where every link is moved to a
+            random city with `rewire_chance` (default: 0.1)
+
+    Distances of chain and small world networks are drawn uniformly from
+    the inclusive `distance_range`. Providing a `seed` makes networks
+    reproducible.
+    """
+    builders = {
+        'chain': _chain_network,
+        'geometric': _geometric_network,
+        'small_world': _small_world_network}
+    if topology not in builders:
+        raise ValueError(f'Unknown network topology: {topology!r}')
+    rng = numpy.random.default_rng(seed)
+    city_ids = numpy.asarray(city_ids, dtype='int64')
+    sources, targets, distance = builders[topology](
+        rng, len(city_ids), distance_range, **params)
+    lower = numpy.minimum(sources, targets)
+    higher = numpy.maximum(sources, targets)
+    order = numpy.lexsort((higher, lower))
+    lower, higher = lower[order], higher[order]
+    unique = lower != higher
+    unique[1:] &= (lower[1:] != lower[:-1]) | (higher[1:] != higher[:-1])
+    if distance is None:
+        distance = rng.integers(
+            distance_range[0], distance_range[1] + 1, size=unique.sum())
+    else:
+        distance = distance(lower[unique], higher[unique])
+    return NetworkEdges(
+        city_ids[lower[unique]], city_ids[higher[unique]], distance)
+
+
+def network_vertices(edges):
+    """Returns NetworkVertex objects for all cities in a network, by id.
+
+    Every vertex has a `transport_links` mapping of neighbouring vertices
+    to their distance, so that these can be used for `dijkstra` searches.
+    """
+    vertices = {}
+    for lower, higher, distance in zip(*map(list, edges)):
+        if lower not in vertices:
+            vertices[lower] = NetworkVertex(lower)
+        if higher not in vertices:
+            vertices[higher] = NetworkVertex(higher)
+        vertices[lower].transport_links[vertices[higher]] = distance
+        vertices[higher].transport_links[vertices[lower]] = distance
+    return vertices
+
+
+def _chain_network(rng, count, distance_range, max_hop_distance=3):
+    """Returns positional edges of full-circle chains through all cities."""
+    chain_count = round(count ** (1 / max_hop_distance) - 0.25)
+    chains = [rng.permutation(count) for _chain in range(chain_count)]
+    sources = numpy.concatenate(chains or [numpy.empty(0, 'int64')])
+    targets = numpy.concatenate(
+        [numpy.roll(chain, -1) for chain in chains] or [sources])
+    return sources, targets, None
+
+
+def _geometric_network(rng, count, distance_range, neighbours=6, scale=10):
+    """Returns positional edges between cities and their nearest neighbours.
+
+    The square is divided into a grid of cells holding at least twice the
+    number of neighbours on average. Neighbours are searched in the cells
+    around the cell of each city, which finds the true nearest neighbours
+    unless these are further away than the size of a cell.
+    """
+    side = math.sqrt(count)
+    points = rng.random((count, 2)) * side
+    cells_per_side = max(1, int(side / math.sqrt(max(16, 2 * neighbours))))
+    cell = numpy.minimum(
+        (points / side * cells_per_side).astype('int64'), cells_per_side - 1)
+    cell_ids = cell[:, 1] * cells_per_side + cell[:, 0]
+    order = numpy.argsort(cell_ids, kind='stable')
+    starts = numpy.searchsorted(
+        cell_ids[order], numpy.arange(cells_per_side ** 2 + 1))
+    sources, targets = [], []
+    for row in range(cells_per_side):
+        rows = range(max(0, row - 1), min(cells_per_side, row + 2))
+        for column in range(cells_per_side):
+            members = order[starts[row * cells_per_side + column]:
+                            starts[row * cells_per_side + column + 1]]
+            if not len(members):
+                continue
+            left = max(0, column - 1)
+            right = min(cells_per_side, column + 2)
+            candidates = numpy.concatenate([
+                order[starts[near * cells_per_side + left]:
+                      starts[near * cells_per_side + right]]
+                for near in rows])
+            nearest = _nearest(points, members, candidates, neighbours)
+            sources.append(numpy.repeat(members, nearest.shape[1]))
+            targets.append(candidates[nearest].ravel())
+
+    def distance(lower, higher):
+        length = numpy.hypot(*(points[lower] - points[higher]).T)
+        return numpy.maximum(1, numpy.ceil(length * scale)).astype('int64')
+
+    empty = [numpy.empty(0, 'int64')]
+    return (
+        numpy.concatenate(sources or empty),
+        numpy.concatenate(targets or empty),
+        distance)
+
+
+def _nearest(points, members, candidates, count):
+    """Returns for each member the candidate positions of its nearest points.
+
+    Members are excluded from being their own nearest point.
+    """
+    count = min(count, len(candidates) - 1)
+    if count < 1:
+        return numpy.empty((len(members), 0), 'int64')
+    offsets = points[members][:, None, :] - points[candidates][None, :, :]
+    squared = numpy.einsum('ijk,ijk->ij', offsets, offsets)
+    squared[members[:, None] == candidates[None, :]] = numpy.inf
+    return numpy.argpartition(squared, count - 1, axis=1)[:, :count]
+
+
+def _small_world_network(
+        rng, count, distance_range, neighbours=4, rewire_chance=0.1):
+    """Returns positional edges of a Watts-Strogatz small world network."""
+    positions = numpy.arange(count)
+    sources = numpy.tile(positions, neighbours // 2)
+    targets = numpy.concatenate([
+        (positions + offset) % max(count, 1)
+        for offset in range(1, neighbours // 2 + 1)] or [sources])
+    rewired = rng.random(len(targets)) < rewire_chance
+    targets[rewired] = rng.integers(count, size=rewired.sum())
+    return sources, targets, None
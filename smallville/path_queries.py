@@ -0,0 +1,101 @@
+from sqlalchemy import (
+    Integer,
+    case,
+    func,
+    literal_column,
+    or_,
+    select)
+from sqlalchemy.sql.expression import ClauseElement
+
+from . models import (
+    City,
+    TransportLink)
+
+
+def shortest_paths(origins, max_distance=None, max_hops=None):
+    """Returns a query for the shortest network distances from cities.
+
+    `origins`: a list of city ids, or a SELECT statement returning a single
+        column of city ids (e.g. the home cities of a group of people)
+    `max_distance` and `max_hops`: bounds for the search, at least one of
+        which is required
+
+    The search is expressed as a recursive common table expression over the
+    `transport_link` table, which runs on both PostgreSQL and SQLite (3.8.3
+    or newer). Every step extends the reached cities by one link, and only
+    distinct states of city and distance (and hops, when bounded) are kept.
+    With a distance bound, the work is limited by the number of cities times
+    the number of distances, rather than by the number of possible routes.
+
+    The query has the columns `origin_id`, `city_id` and `distance`, with a
+    row for every city reachable within the bounds, including the origin
+    itself at distance 0. As a regular SELECT, it can be used as a subquery
+    or joined into larger queries.
+    """
+    reached = _reached_cities(origins, max_distance, max_hops)
+    return select([
+        reached.c.origin_id,
+        reached.c.city_id,
+        func.min(reached.c.distance).label('distance'),
+    ]).group_by(reached.c.origin_id, reached.c.city_id)
+
+
+def nearest_cities(origins, count, max_distance=None, max_hops=None):
+    """Returns a query for the nearest `count` cities of every origin.
+
+    The query has the columns `origin_id`, `city_id`, `distance` and `rank`,
+    where rank 1 is the nearest city other than the origin itself, and ties
+    in distance are ordered by city id. See `shortest_paths` for `origins`
+    and the bounds of the search.
+
+    Origins may have fewer than `count` cities within the bounds. Limiting
+    the search to `count` hops always finds all of the nearest cities (they
+    are reached through nearer cities only), but as hops are then tracked as
+    well, this is much slower than a distance bound of similar reach.
+    """
+    paths = shortest_paths(origins, max_distance, max_hops).subquery('paths')
+    ranked = select([
+        paths,
+        func.row_number().over(
+            partition_by=paths.c.origin_id,
+            order_by=(paths.c.distance, paths.c.city_id)).label('rank'),
+    ]).where(paths.c.city_id != paths.c.origin_id).subquery('ranked')
+    return select([ranked]).where(ranked.c.rank <= count)
+
+
+def _reached_cities(origins, max_distance, max_hops):
+    """Returns a recursive CTE of cities reached from origins, by distance.
+
+    Links are followed in both directions: from a reached city, the next
+    city is the other end of any link that the reached city is part of.
+    """
+    if max_distance is None and max_hops is None:
+        raise ValueError('Path search requires a max_distance or max_hops')
+    if isinstance(origins, ClauseElement):
+        origin_id, = origins.subquery('origins').c
+    else:
+        origin_id = City.id
+    anchor = select([
+        origin_id.label('origin_id'),
+        origin_id.label('city_id'),
+        literal_column('0', Integer).label('distance')])
+    if not isinstance(origins, ClauseElement):
+        anchor = anchor.where(City.id.in_(list(origins)))
+    if max_hops is not None:
+        anchor = anchor.add_columns(literal_column('0', Integer).label('hops'))
+    reached = anchor.cte('reached', recursive=True)
+
+    link = TransportLink.__table__
+    next_city = case(
+        [(link.c.lower_city_id == reached.c.city_id, link.c.higher_city_id)],
+        else_=link.c.lower_city_id)
+    distance = reached.c.distance + link.c.distance
+    step = select([reached.c.origin_id, next_city, distance]).where(or_(
+        link.c.lower_city_id == reached.c.city_id,
+        link.c.higher_city_id == reached.c.city_id))
+    if max_distance is not None:
+        step = step.where(distance <= max_distance)
+    if max_hops is not None:
+        step = step.add_columns(reached.c.hops + 1).where(
+            reached.c.hops < max_hops)
+    return reached.union(step)
@@ -0,0 +1,112 @@
+import collections
+import functools
+
+from sqlalchemy import (
+    and_,
+    func,
+    select)
+
+from . compact import (
+    decode,
+    is_compact)
+from . models import (
+    City,
+    Company,
+    Employment,
+    Person)
+
+
+# #############################################################################
+# Streaming read-only records
+#
+def records(connection, statement, chunk_size=10000):
+    """Yields compact, read-only records for the rows of a SELECT statement.
+
+    Rows are fetched in chunks of `chunk_size` using a server-side cursor
+    (where supported by the database driver), which keeps memory bounded
+    regardless of the size of the result. Each row is returned as a named
+    tuple with fields named after the selected columns. No ORM objects are
+    created, so there is no identity map or attribute instrumentation cost.
+    """
+    result = _stream(connection, statement)
+    record = record_type(*result.keys())
+    for rows in _chunks(result, chunk_size):
+        yield from map(record._make, rows)
+
+
+def model_records(connection, model, *criteria, chunk_size=10000):
+    """Yields read-only records for all rows of a model's table.
+
+    Any `criteria` given are applied as a WHERE clause, e.g. to select all
+    people of a single city: `model_records(conn, Person, Person.city_id == 1)`
+
+    On a database converted to the compact schema (`smallville.compact`),
+    encoded names are decoded, so records have the same fields either way.
+    """
+    statement = select(list(model.__table__.columns))
+    if criteria:
+        statement = statement.where(and_(*criteria))
+    if is_compact(connection):
+        statement = decode(statement)
+    return records(connection, statement, chunk_size=chunk_size)
+
+
+def column_chunks(connection, statement, chunk_size=10000):
+    """Yields the result of a SELECT statement in columnar chunks.
+
+    Every chunk is a dictionary mapping column names to tuples of values, all
+    of which are of equal length (at most `chunk_size`).
+    """
+    result = _stream(connection, statement)
+    keys = list(result.keys())
+    for rows in _chunks(result, chunk_size):
+        yield dict(zip(keys, zip(*rows)))
+
+
+@functools.lru_cache(maxsize=None)
+def record_type(*fields):
+    """Returns a (cached) named tuple type for the given field names."""
+    return collections.namedtuple('Record', fields, rename=True)
+
+
+# #############################################################################
+# Typical reporting queries
+#
+def payroll_by_company():
+    """Returns a statement for headcount and payroll of every company."""
+    return select([
+        Company.id.label('company_id'),
+        Company.name,
+        func.count(Employment.person_id).label('headcount'),
+        func.coalesce(func.sum(Employment.salary), 0).label('payroll'),
+    ]).select_from(
+        Company.__table__.outerjoin(Employment.__table__)
+    ).group_by(Company.id, Company.name).order_by(Company.id)
+
+
+def population_by_city():
+    """Returns a statement for the number of inhabitants of every city."""
+    return select([
+        City.id.label('city_id'),
+        City.name,
+        func.count(Person.id).label('population'),
+    ]).select_from(
+        City.__table__.outerjoin(Person.__table__)
+    ).group_by(City.id, City.name).order_by(City.id)
+
+
+# #############################################################################
+# Private helper functions
+#
+def _chunks(result, chunk_size):
+    """Yields lists of rows from the result until it is exhausted."""
+    while True:
+        rows = result.fetchmany(chunk_size)
+        if not rows:
+            return
+        yield rows
+
+
+def _stream(connection, statement):
+    """Executes a statement, using a server-side cursor where supported."""
+    return connection.execution_options(stream_results=True).execute(statement)
@@ -0,0 +1,307 @@
+import datetime
+
+import numpy
+from sqlalchemy import (
+    and_,
+    bindparam,
+    select)
+
+from . generators import (
+    ROLE_PERCENTILES,
+    ROLES,
+    role_salaries)
+from . models import (
+    CITY_SIZE_CODES,
+    City,
+    Company,
+    Employment,
+    Person)
+from . records import column_chunks
+
+SIZE_CODES = tuple(CITY_SIZE_CODES.enums)
+
+
+class Simulation:
+    """Runs a world forward in yearly ticks, using columnar (numpy) state.
+
+    People, their employment and companies are loaded into flat arrays, each
+    tick then applies the following to the whole population at once:
+
+        - People age; those reaching the retirement age leave their job
+        - Employed people leave their job at the yearly turnover rate
+        - Salaries drift, by a factor drawn from a normal distribution
+        - Companies hire the unemployed of working age that live in their
+            city. As in seeding, every candidate applies at the companies in
+            their city one after another, until hired. Companies first fill
+            the positions vacated since they reached their highest headcount.
+            Beyond that, they hire with a chance that diminishes with their
+            headcount, following the hiring slowdown curve used for seeding.
+            New hires get a role and salary as in seeding.
+
+    Only the net changes since loading (or the last write) are written back
+    to the database, as bulk deletes, inserts and updates of Employment. As
+    people are only hired locally, new contracts have no commute distance.
+
+    People are assumed to hold at most one contract, as in generated worlds.
+    Additional contracts are left alone by the simulation.
+    """
+    RETIREMENT_AGE = 67
+    SALARY_DRIFT = 1.02, 0.03
+    TURNOVER_RATE = 0.08
+
+    def __init__(
+            self,
+            people,
+            contracts,
+            companies,
+            salary_bands,
+            hiring_slowdown,
+            date=None,
+            seed=None):
+        """Initializes the simulation from dictionaries of column arrays.
+
+        `people`: arrays for 'id', 'city_id' and 'birthday'
+        `contracts`: arrays for 'person_id', 'company_id', 'role', 'salary'
+        `companies`: arrays for 'id', 'city_id' and 'size_code'
+        `salary_bands` and `hiring_slowdown`: dicts with 2-tuples of (mean,
+            stddev) mapped to city size code, as used by CompanyGenerator.
+        `date`: the date at which the simulation starts, defaults to today
+        `seed`: seed for the random generator, for reproducible runs
+        """
+        self.rng = numpy.random.default_rng(seed)
+        self.date = date or datetime.date.today()
+        self.ticks = 0
+
+        order = numpy.argsort(companies['city_id'], kind='stable')
+        self.company_id = numpy.asarray(companies['id'])[order]
+        company_city = numpy.asarray(companies['city_id'])[order]
+        self.company_size = numpy.asarray(companies['size_code'])[order]
+        self.salary_bands = numpy.array(
+            [salary_bands[size] for size in SIZE_CODES])
+        slowdown = numpy.array([hiring_slowdown[size] for size in SIZE_CODES])
+        self.slowdown = self.rng.normal(*slowdown[self.company_size].T)
+
+        person_order = numpy.argsort(people['id'], kind='stable')
+        self.person_id = numpy.asarray(people['id'])[person_order]
+        self.birthday = numpy.asarray(
+            people['birthday'], 'datetime64[D]')[person_order]
+        cities, first = numpy.unique(company_city, return_index=True)
+        self.city_company_start = numpy.append(first, 0)
+        self.city_company_count = numpy.append(
+            numpy.diff(numpy.append(first, len(company_city))), 0)
+        self.person_city = _positions(
+            cities, numpy.asarray(people['city_id'])[person_order])
+
+        self.employer = numpy.full(len(self.person_id), -1)
+        self.role = numpy.zeros(len(self.person_id), 'int8')
+        self.salary = numpy.zeros(len(self.person_id), 'int64')
+        self._load_contracts(contracts, numpy.argsort(self.company_id))
+        self.headcount = numpy.bincount(
+            self.employer[self.employer >= 0],
+            minlength=len(self.company_id))
+        self.positions = self.headcount.copy()
+        self._mark_written()
+
+    @classmethod
+    def load(cls, connection, salary_bands, hiring_slowdown, **kwds):
+        """Returns a simulation with state loaded from the database."""
+        people = _load_columns(connection, select([
+            Person.id, Person.city_id, Person.birthday]).order_by(Person.id))
+        contracts = _load_columns(connection, select([
+            Employment.person_id, Employment.company_id, Employment.role,
+            Employment.salary]))
+        contracts['role'] = [ROLES.index(role) for role in contracts['role']]
+        companies = _load_columns(connection, select([
+            Company.id, Company.city_id, City.size_code,
+        ]).select_from(Company.__table__.join(City.__table__)))
+        companies['size_code'] = [
+            SIZE_CODES.index(size) for size in companies['size_code']]
+        return cls(
+            people, contracts, companies, salary_bands, hiring_slowdown,
+            **kwds)
+
+    def age(self):
+        """Returns the age in whole years of every person."""
+        days = numpy.datetime64(self.date, 'D') - self.birthday
+        return (days.astype(int) // 365.25).astype(int)
+
+    def run(self, years):
+        """Advances the simulation by a number of years."""
+        for _year in range(years):
+            self.tick()
+
+    def tick(self):
+        """Advances the simulation by a single year."""
+        self.date = _add_year(self.date)
+        self.ticks += 1
+        working_age = self.age() < self.RETIREMENT_AGE
+        employed = self.employer >= 0
+        leaving = employed & (
+            (self.rng.random(len(employed)) < self.TURNOVER_RATE) |
+            ~working_age)
+        self._end_contracts(leaving)
+        self._drift_salaries()
+        self._hire((self.employer < 0) & working_age)
+
+    def write_back(self, connection, chunk_size=10000):
+        """Writes contract changes since the last write to the database.
+
+        Returns a dictionary with the number of contracts that ended, started
+        and had their salary changed. As these are bulk changes, statistics
+        tables are not updated, and should be refreshed afterwards.
+        """
+        moved = self.employer != self._written_employer
+        ended = numpy.flatnonzero(moved & (self._written_employer >= 0))
+        started = numpy.flatnonzero(moved & (self.employer >= 0))
+        changed = numpy.flatnonzero(
+            ~moved & (self.employer >= 0) &
+            ((self.salary != self._written_salary) |
+             (self.role != self._written_role)))
+        table = Employment.__table__
+        for_contract = and_(
+            table.c.person_id == bindparam('p_id'),
+            table.c.company_id == bindparam('c_id'))
+        statements = [
+            (table.delete().where(for_contract),
+             ended, self._written_employer),
+            (table.insert().values(
+                person_id=bindparam('p_id'), company_id=bindparam('c_id'),
+                commute_distance=0),
+             started, self.employer),
+            (table.update().where(for_contract),
+             changed, self.employer)]
+        for statement, people, employer in statements:
+            for start in range(0, len(people), chunk_size):
+                rows = self._contract_rows(
+                    people[start:start + chunk_size], employer)
+                connection.execute(statement, rows)
+        self._mark_written()
+        return {
+            'ended': len(ended),
+            'started': len(started),
+            'salary_changed': len(changed)}
+
+    def _contract_rows(self, people, employer):
+        """Returns parameter dictionaries for the contracts of people."""
+        columns = zip(
+            self.person_id[people].tolist(),
+            self.company_id[employer[people]].tolist(),
+            (ROLES[role] for role in self.role[people].tolist()),
+            self.salary[people].tolist())
+        return [
+            {'p_id': person, 'c_id': company, 'role': role, 'salary': salary}
+            for person, company, role, salary in columns]
+
+    def _drift_salaries(self):
+        employed = numpy.flatnonzero(self.employer >= 0)
+        drift = self.rng.normal(*self.SALARY_DRIFT, size=len(employed))
+        self.salary[employed] = numpy.round(self.salary[employed] * drift)
+
+    def _end_contracts(self, people):
+        self.headcount -= numpy.bincount(
+            self.employer[people], minlength=len(self.headcount))
+        self.employer[people] = -1
+        self.salary[people] = 0
+
+    def _hire(self, candidates):
+        """Lets candidates apply at the companies in their city, in turn.
+
+        Every candidate starts at a random company in their city, and moves
+        on to the next until hired, or all companies have turned them down.
+        All candidates apply at the same time, in rounds of one company each.
+        Companies with vacant positions hire as many of their applicants as
+        they have vacancies, others hire by their hiring chance.
+        """
+        candidates = numpy.flatnonzero(candidates)
+        options = self.city_company_count[self.person_city[candidates]]
+        candidates, options = candidates[options > 0], options[options > 0]
+        start = self.city_company_start[self.person_city[candidates]]
+        offset = (self.rng.random(len(candidates)) * options).astype(int)
+        for attempt in range(options.max(initial=0)):
+            picks = start + (offset + attempt) % options
+            vacancies = self.positions[picks] - self.headcount[picks]
+            chance = numpy.power(self.slowdown[picks], -self.headcount[picks])
+            hired = numpy.where(
+                vacancies > 0,
+                _group_ranks(picks) < vacancies,
+                self.rng.random(len(candidates)) < chance)
+            self._start_contracts(candidates[hired], picks[hired])
+            remaining = ~hired & (options > attempt + 1)
+            candidates, start, options, offset = (
+                arr[remaining] for arr in (candidates, start, options, offset))
+
+    def _load_contracts(self, contracts, company_order):
+        """Assigns loaded contracts to people, by their array positions."""
+        people = numpy.searchsorted(self.person_id, contracts['person_id'])
+        companies = company_order[numpy.searchsorted(
+            self.company_id, contracts['company_id'], sorter=company_order)]
+        _unique, first = numpy.unique(people, return_index=True)
+        people, companies = people[first], companies[first]
+        self.employer[people] = companies
+        self.role[people] = numpy.asarray(contracts['role'])[first]
+        self.salary[people] = numpy.asarray(contracts['salary'])[first]
+
+    def _mark_written(self):
+        self._written_employer = self.employer.copy()
+        self._written_role = self.role.copy()
+        self._written_salary = self.salary.copy()
+
+    def _start_contracts(self, people, companies):
+        """Employs people at companies, with a random role and salary."""
+        bands = self.salary_bands[self.company_size[companies]]
+        first, second = (
+            self.rng.normal(bands[:, 0], bands[:, 1]) for _draw in range(2))
+        percentile = self.rng.random(len(people))
+        role = numpy.digitize(percentile, ROLE_PERCENTILES).astype('int8')
+        salary = numpy.choose(role, role_salaries(first, second))
+        self.employer[people] = companies
+        self.role[people] = role
+        self.salary[people] = numpy.round(salary)
+        self.headcount += numpy.bincount(
+            companies, minlength=len(self.headcount))
+        numpy.maximum(self.positions, self.headcount, out=self.positions)
+
+
+def _add_year(date):
+    """Returns the same date a year later (or 28th February for leap days)."""
+    try:
+        return date.replace(year=date.year + 1)
+    except ValueError:
+        return date.replace(year=date.year + 1, day=28)
+
+
+def _group_ranks(keys):
+    """Returns the rank of every key among the earlier occurrences of it.
+
+    The first occurrence of every distinct key is ranked 0, the second 1, etc.
+    """
+    order = numpy.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    ranks = numpy.empty(len(keys), int)
+    ranks[order] = numpy.arange(len(keys)) - numpy.searchsorted(
+        sorted_keys, sorted_keys)
+    return ranks
+
+
+def _positions(keys, values):
+    """Returns the positions of values in the sorted keys array.
+
+    Values that are not present in the keys are given the position just
+    past the end of the keys array.
+    """
+    positions = numpy.searchsorted(keys, values)
+    found = positions < len(keys)
+    found[found] = keys[positions[found]] == values[found]
+    positions[~found] = len(keys)
+    return positions
+
+
+def _load_columns(connection, statement):
+    """Returns a dictionary of column lists for the result of a statement."""
+    columns = {}
+    for chunk in column_chunks(connection, statement):
+        for name, values in chunk.items():
+            columns.setdefault(name, []).extend(values)
+    if not columns:
+        columns = {name: [] for name in statement.selected_columns.keys()}
+    return columns
@@ -0,0 +1,291 @@
+import csv
+import io
+import json
+import os
+
+import numpy
+from sqlalchemy import (
+    func,
+    select)
+from sqlalchemy.sql.sqltypes import (
+    Date,
+    Enum,
+    Integer,
+    Text)
+from sqlalchemy.sql.type_api import Variant
+
+from . base import Base
+from . compact import (
+    CompactBase,
+    Industry,
+    is_compact)
+
+MANIFEST = 'manifest.json'
+
+
+class Snapshot:
+    """A generated world, saved as a directory of columnar binary files.
+
+    Every table is stored in a subdirectory, with one `.npy` file per column.
+    Loaded columns are memory-mapped rather than read, so opening a snapshot
+    is near instantaneous and analysis only pages in the columns it uses.
+    Columns are stored as follows:
+
+        - Integer: 64-bit integers; nullable columns have a boolean mask
+            stored alongside them in `{column}.null.npy`
+        - Date: numpy datetime64 with day precision
+        - Text and Enum: dictionary encoded, as integer codes into a list of
+            categories stored in `{column}.categories.npy`
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, MANIFEST)) as fp:
+            self.manifest = json.load(fp)
+        self.tables = {
+            name: TableSnapshot(os.path.join(path, name), columns)
+            for name, columns in self.manifest['tables'].items()}
+
+    def __getitem__(self, table_name):
+        return self.tables[table_name]
+
+    def __repr__(self):
+        return f'<Snapshot {self.path!r}: {", ".join(self.tables)}>'
+
+    @property
+    def metadata(self):
+        """Returns the metadata of the schema the snapshot was saved from."""
+        if Industry.__tablename__ in self.tables:
+            return CompactBase.metadata
+        return Base.metadata
+
+
+class TableSnapshot:
+    """Columnar, memory-mapped data for a single table in a snapshot."""
+    def __init__(self, path, columns):
+        self.path = path
+        self.columns = columns
+        self._arrays = {}
+
+    def __getitem__(self, column):
+        """Returns the stored array for a column; codes for encoded columns."""
+        if column not in self._arrays:
+            self._arrays[column] = self._load(column)
+        return self._arrays[column]
+
+    def __len__(self):
+        if not self.columns:
+            return 0
+        return len(self[next(iter(self.columns))])
+
+    def _load(self, name, suffix=''):
+        filename = os.path.join(self.path, f'{name}{suffix}.npy')
+        return numpy.load(filename, mmap_mode='r')
+
+    def categories(self, column):
+        """Returns the categories of a dictionary encoded column."""
+        return self._load(column, '.categories')
+
+    def decode(self, column, rows=slice(None)):
+        """Returns column values, resolving categories where applicable.
+
+        Nullable columns are returned as masked arrays. Providing a slice for
+        `rows` limits decoding to only those rows.
+        """
+        kind = self.columns[column]['kind']
+        if kind == 'category':
+            return self.categories(column)[self[column][rows]]
+        if self.columns[column]['nullable']:
+            return numpy.ma.masked_array(
+                self[column][rows], mask=self._load(column, '.null')[rows])
+        return self[column][rows]
+
+    def chunks(self, size=10000):
+        """Yields lists of row dictionaries with Python native values."""
+        names = list(self.columns)
+        for start in range(0, len(self), size):
+            values = []
+            for name in names:
+                column = self.decode(name, slice(start, start + size))
+                if numpy.ma.isMaskedArray(column):
+                    column = numpy.where(
+                        column.mask, None, column.data.astype(object))
+                values.append(column.tolist())
+            yield [dict(zip(names, row)) for row in zip(*values)]
+
+
+# #############################################################################
+# Saving and loading snapshots
+#
+def save_snapshot(connection, path, metadata=None, chunk_size=10000):
+    """Saves all tables from the database to a snapshot at the given path.
+
+    Rows are streamed from the database in chunks of `chunk_size` and written
+    directly into memory-mapped output files. Memory use is limited to a
+    single chunk and the categories of dictionary encoded columns.
+
+    Unless given, the `metadata` is that of the compact schema for databases
+    converted by `smallville.compact.encode_names`, or the regular one.
+    """
+    if metadata is None:
+        metadata = Base.metadata
+        if is_compact(connection):
+            metadata = CompactBase.metadata
+    manifest = {'tables': {}}
+    for table in metadata.sorted_tables:
+        table_path = os.path.join(path, table.name)
+        os.makedirs(table_path, exist_ok=True)
+        manifest['tables'][table.name] = _save_table(
+            connection, table, table_path, chunk_size)
+    with open(os.path.join(path, MANIFEST), 'w') as fp:
+        json.dump(manifest, fp, indent=2)
+    return Snapshot(path)
+
+
+def load_snapshot(connection, snapshot, metadata=None, chunk_size=10000):
+    """Loads all snapshot tables into the database, in dependency order.
+
+    On PostgreSQL (psycopg2) the data is sent using COPY, otherwise chunks
+    of rows are inserted using executemany. For the best performance, load
+    into tables created with `create_tables_deferred`. Returns a dictionary
+    with the number of rows loaded for each table.
+
+    As rows are loaded with their primary keys, PostgreSQL sequences are
+    moved past the highest loaded key afterwards. Unless given, `metadata` is
+    that of the schema the snapshot was saved from, which the database should
+    have been created with.
+    """
+    if not isinstance(snapshot, Snapshot):
+        snapshot = Snapshot(snapshot)
+    if metadata is None:
+        metadata = snapshot.metadata
+    copy = connection.dialect.driver == 'psycopg2'
+    row_counts = {}
+    for table in metadata.sorted_tables:
+        table_snapshot = snapshot[table.name]
+        for rows in table_snapshot.chunks(chunk_size):
+            if copy:
+                _copy_rows(connection, table, rows)
+            else:
+                connection.execute(table.insert(), rows)
+        row_counts[table.name] = len(table_snapshot)
+        if connection.dialect.name == 'postgresql':
+            _reset_sequence(connection, table)
+    return row_counts
+
+
+# #############################################################################
+# Private helper functions
+#
+def _column_kind(column):
+    """Returns the storage kind and dtype for a column, based on its type."""
+    column_type = column.type
+    if isinstance(column_type, Variant):
+        column_type = column_type.impl
+    if isinstance(column_type, Enum):
+        return 'category', 'int8'
+    if isinstance(column_type, Text):
+        return 'category', 'int32'
+    if isinstance(column_type, Date):
+        return 'date', 'datetime64[D]'
+    if isinstance(column_type, Integer):
+        return 'integer', 'int64'
+    raise TypeError(f'Unsupported column type for snapshot: {column.type!r}')
+
+
+def _copy_rows(connection, table, rows):
+    """Sends rows to a PostgreSQL table using COPY in CSV format.
+
+    The CSV writer quotes None as an empty string, which COPY reads as an
+    empty string rather than NULL. For nullable columns, FORCE_NULL makes
+    COPY read these as NULL instead.
+    """
+    columns = list(rows[0])
+    buffer = io.StringIO()
+    csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC).writerows(
+        [row[column] for column in columns] for row in rows)
+    buffer.seek(0)
+    options = ['FORMAT csv']
+    nullable = [column for column in columns if table.c[column].nullable]
+    if nullable:
+        options.append(f'FORCE_NULL ({", ".join(nullable)})')
+    cursor = connection.connection.cursor()
+    cursor.copy_expert(
+        f'COPY {table.name} ({", ".join(columns)}) FROM STDIN '
+        f'WITH ({", ".join(options)})',
+        buffer)
+
+
+def _reset_sequence(connection, table):
+    """Sets the serial sequence of a table's primary key to its maximum."""
+    primary_keys = list(table.primary_key.columns)
+    if len(primary_keys) == 1 and isinstance(primary_keys[0].type, Integer):
+        primary_key, = primary_keys
+        connection.execute(
+            select([func.setval(
+                func.pg_get_serial_sequence(table.name, primary_key.name),
+                func.coalesce(func.max(primary_key), 0) + 1,
+                False)]))
+
+
+def _save_table(connection, table, path, chunk_size):
+    """Streams a table's rows into per-column memory-mapped .npy files."""
+    row_count = connection.scalar(select([func.count()]).select_from(table))
+    writers = [_ColumnWriter(path, column, row_count) for column in table.c]
+    query = select([table]).order_by(*table.primary_key.columns)
+    result = connection.execution_options(stream_results=True).execute(query)
+    offset = 0
+    while True:
+        rows = result.fetchmany(chunk_size)
+        if not rows:
+            break
+        for writer, values in zip(writers, zip(*rows)):
+            writer.write(offset, values)
+        offset += len(rows)
+    return {writer.name: writer.close() for writer in writers}
+
+
+class _ColumnWriter:
+    """Writes values for a single column into a memory-mapped .npy file."""
+    def __init__(self, path, column, row_count):
+        self.path = path
+        self.name = column.name
+        self.kind, self.dtype = _column_kind(column)
+        self.nullable = column.nullable
+        self.output = _open_output(path, self.name, self.dtype, row_count)
+        self.nulls = self.encoder = None
+        if self.nullable:
+            self.nulls = _open_output(
+                path, f'{self.name}.null', 'bool', row_count)
+        if self.kind == 'category':
+            categories = getattr(column.type, 'enums', ())
+            self.encoder = {val: code for code, val in enumerate(categories)}
+
+    def close(self):
+        """Flushes output files and returns the column's manifest entry."""
+        self.output.flush()
+        if self.nulls is not None:
+            self.nulls.flush()
+        if self.encoder is not None:
+            numpy.save(
+                os.path.join(self.path, f'{self.name}.categories.npy'),
+                numpy.array(list(self.encoder), dtype=str))
+        return {
+            'kind': self.kind, 'dtype': self.dtype, 'nullable': self.nullable}
+
+    def write(self, offset, values):
+        """Writes a sequence of values to the column, starting at offset."""
+        end = offset + len(values)
+        if self.encoder is not None:
+            encoder = self.encoder
+            values = [encoder.setdefault(val, len(encoder)) for val in values]
+        elif self.nulls is not None:
+            self.nulls[offset:end] = [value is None for value in values]
+            values = [0 if value is None else value for value in values]
+        self.output[offset:end] = values
+
+
+def _open_output(path, name, dtype, row_count):
+    """Returns a writable memory-mapped .npy file of the given length."""
+    return numpy.lib.format.open_memmap(
+        os.path.join(path, f'{name}.npy'),
+        mode='w+', dtype=dtype, shape=(row_count,))
@@ -0,0 +1,408 @@
+from collections import defaultdict
+
+from sqlalchemy import (
+    Column,
+    Integer,
+    MetaData,
+    Table,
+    and_,
+    case,
+    event,
+    func,
+    select)
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history
+
+from . import compact
+from . models import (
+    City,
+    CityStatistics,
+    Company,
+    CompanyStatistics,
+    Employment,
+    IndustryStatistics,
+    Person,
+    load_network)
+from . pathfinding import dijkstra
+
+# Models of people and companies, in the regular and compact schema
+_PERSON_MODELS = Person, compact.Person
+_COMPANY_MODELS = Company, compact.Company
+
+
+# #############################################################################
+# Bulk refresh
+#
+def refresh_statistics(connection):
+    """Rebuilds all aggregate tables from the current people and employment.
+
+    This replaces the contents of the statistics tables using a single
+    INSERT .. SELECT per table, and is meant to be run once after seeding (or
+    bulk loading) the database. Afterwards, `maintain_statistics` keeps them
+    up to date with changes made through the ORM. Databases converted to the
+    compact schema (`smallville.compact`) are supported as well.
+    """
+    for model in (CityStatistics, CompanyStatistics, IndustryStatistics):
+        connection.execute(model.__table__.delete())
+    for model, query in [
+            (CityStatistics, _city_statistics()),
+            (CompanyStatistics, _company_statistics()),
+            (IndustryStatistics, _industry_statistics(connection))]:
+        table = model.__table__
+        connection.execute(
+            table.insert().from_select(list(table.columns), query))
+
+
+def _city_statistics():
+    person, employment, company = (
+        Person.__table__, Employment.__table__, Company.__table__)
+    population = select([
+        person.c.city_id,
+        func.count().label('population'),
+    ]).group_by(person.c.city_id).alias('population')
+    employed = select([
+        person.c.city_id,
+        func.count().label('employed'),
+        func.sum(case(
+            [(company.c.city_id != person.c.city_id, 1)], else_=0)
+        ).label('commuters'),
+    ]).select_from(
+        employment.join(person).join(company)
+    ).group_by(person.c.city_id).alias('employed')
+    return select([
+        City.id,
+        func.coalesce(population.c.population, 0),
+        func.coalesce(employed.c.employed, 0),
+        func.coalesce(employed.c.commuters, 0),
+    ]).select_from(
+        City.__table__
+        .outerjoin(population, population.c.city_id == City.id)
+        .outerjoin(employed, employed.c.city_id == City.id))
+
+
+def _company_statistics():
+    return select([
+        Company.id,
+        func.count(Employment.person_id),
+        func.coalesce(func.sum(Employment.salary), 0),
+    ]).select_from(
+        Company.__table__.outerjoin(Employment.__table__)
+    ).group_by(Company.id)
+
+
+def _industry_statistics(connection):
+    company, companies, industry = _company_industries(connection)
+    employment = Employment.__table__
+    return select([
+        industry,
+        City.size_code,
+        func.count(employment.c.person_id),
+        func.coalesce(func.sum(employment.c.salary), 0),
+    ]).select_from(
+        companies
+        .join(City.__table__, City.id == company.c.city_id)
+        .outerjoin(employment, employment.c.company_id == company.c.id)
+    ).group_by(industry, City.size_code)
+
+
+def _company_industries(connection):
+    """Returns the company table, its join to industries, and the industry.
+
+    On a database converted to the compact schema, the industry name is
+    selected by joining the company table to the industry lookup table.
+    """
+    if not compact.is_compact(connection):
+        return Company.__table__, Company.__table__, Company.industry
+    company = compact.Company.__table__
+    return (
+        company,
+        company.join(compact.Industry.__table__),
+        compact.Industry.name)
+
+
+# #############################################################################
+# Commute distances
+#
+def refresh_commute_distances(connection, chunk_size=10000):
+    """Stores the network distance between home and work for all employment.
+
+    The distinct pairs of home and work cities are collected first, after
+    which a single shortest path search is performed for every home city with
+    people working elsewhere. The distances are bulk inserted into a
+    temporary table, from which the `commute_distance` of every employment
+    row is updated in a single statement. People working in their home city
+    have a commute distance of 0, those working in a city that cannot be
+    reached from their home have none (NULL). Returns the number of distinct
+    pairs of home and work cities.
+    """
+    person, employment, company = (
+        Person.__table__, Employment.__table__, Company.__table__)
+    pairs = defaultdict(set)
+    for home_id, work_id in connection.execute(select([
+            person.c.city_id, company.c.city_id,
+    ]).select_from(employment.join(person).join(company)).distinct()):
+        pairs[home_id].add(work_id)
+    distances = _commute_distances(connection, pairs)
+    commutes = _commute_table()
+    commutes.create(connection)
+    try:
+        for start in range(0, len(distances), chunk_size):
+            connection.execute(
+                commutes.insert(), distances[start:start + chunk_size])
+        home_city = select([person.c.city_id]).where(
+            person.c.id == employment.c.person_id
+        ).correlate(employment).scalar_subquery()
+        work_city = select([company.c.city_id]).where(
+            company.c.id == employment.c.company_id
+        ).correlate(employment).scalar_subquery()
+        distance = select([commutes.c.distance]).where(and_(
+            commutes.c.home_city_id == home_city,
+            commutes.c.work_city_id == work_city)).scalar_subquery()
+        connection.execute(
+            employment.update().values(commute_distance=distance))
+    finally:
+        commutes.drop(connection)
+    return len(distances)
+
+
+def _commute_distances(connection, pairs):
+    """Returns row dictionaries with distances for home and work city pairs.
+
+    The transport network is only loaded when at least one person works
+    outside of their home city.
+    """
+    if not any(works - {home} for home, works in pairs.items()):
+        return [
+            {'home_city_id': home, 'work_city_id': home, 'distance': 0}
+            for home in pairs]
+    rows = []
+    with Session(bind=connection) as session:
+        cities = {city.id: city for city in load_network(session)}
+        for home_id, work_ids in pairs.items():
+            distance = {cities[home_id]: 0}
+            if work_ids - {home_id}:
+                distance, _previous = dijkstra(cities, cities[home_id])
+            rows.extend({
+                'home_city_id': home_id,
+                'work_city_id': work_id,
+                'distance': distance.get(cities[work_id]),
+            } for work_id in work_ids)
+    return rows
+
+
+def _commute_table():
+    """Returns a temporary table for distances between pairs of cities."""
+    return Table(
+        'commute_distance', MetaData(),
+        Column('home_city_id', Integer, primary_key=True),
+        Column('work_city_id', Integer, primary_key=True),
+        Column('distance', Integer),
+        prefixes=['TEMPORARY'])
+
+
+# #############################################################################
+# Incremental maintenance
+#
+def maintain_statistics(target):
+    """Keeps aggregate tables up to date with ORM changes on flush.
+
+    The `target` can be a Session, a sessionmaker or the Session class. On
+    every flush, new, changed and deleted Person and Employment objects are
+    translated into increments for the affected rows of the statistics
+    tables, which are then updated in the same transaction. People and
+    companies of the compact schema (`smallville.compact`) are tracked too.
+
+    Changes made outside of the ORM unit of work (bulk inserts, changes to a
+    company's industry or city) are not tracked, and require a refresh.
+    """
+    event.listen(target, 'after_flush', _update_statistics)
+
+
+def _update_statistics(session, _flush_context):
+    """Collects changes from the session and applies them as increments."""
+    changes = _FlushChanges(session)
+    if changes:
+        connection = session.connection()
+        contracts = changes.contracts + changes.moved_contracts(connection)
+        update = _StatisticsUpdate(connection, changes.previous_cities)
+        update.apply(contracts, changes.population, changes.created)
+
+
+class _FlushChanges:
+    """Changes to people and employment contracts from a session flush.
+
+    Contracts are 4-tuples of (sign, person_id, company_id, salary), where a
+    negative sign removes the contract from the statistics, and a positive
+    sign adds it. Changes in population are kept as increments per city.
+    """
+    def __init__(self, session):
+        self.session = session
+        self.contracts = []
+        self.created = []
+        self.population = defaultdict(int)
+        self.moved_people = {}
+        self.previous_cities = {}
+        for obj in session.new:
+            self._add_new(obj)
+        for obj in session.deleted:
+            self._add_deleted(obj)
+        for obj in session.dirty:
+            self._add_dirty(obj)
+
+    def __bool__(self):
+        return bool(self.contracts or self.population or self.created)
+
+    def _add_new(self, obj):
+        if isinstance(obj, _PERSON_MODELS):
+            self.population[obj.city_id] += 1
+        elif isinstance(obj, Employment):
+            self.contracts.append(_current_contract(obj))
+        elif isinstance(obj, (City, *_COMPANY_MODELS)):
+            self.created.append(obj)
+
+    def _add_deleted(self, obj):
+        if isinstance(obj, _PERSON_MODELS):
+            self.previous_cities[obj.id] = _previous(obj, 'city_id')
+            self.population[self.previous_cities[obj.id]] -= 1
+        elif isinstance(obj, Employment):
+            self.contracts.append(_previous_contract(obj))
+
+    def _add_dirty(self, obj):
+        if isinstance(obj, _PERSON_MODELS):
+            history = get_history(obj, 'city_id')
+            if history.deleted and history.added:
+                previous, current = history.deleted[0], history.added[0]
+                self.moved_people[obj.id] = previous
+                self.previous_cities[obj.id] = previous
+                self.population[previous] -= 1
+                self.population[current] += 1
+        elif isinstance(obj, Employment) and self.session.is_modified(obj):
+            self.contracts.append(_previous_contract(obj))
+            self.contracts.append(_current_contract(obj))
+
+    def moved_contracts(self, connection):
+        """Returns contracts of moved people that are unchanged in this flush.
+
+        Contracts changed in this flush have already been accounted for, so
+        only other contracts of moved people are moved to their new city.
+        """
+        if not self.moved_people:
+            return []
+        session = self.session
+        changed = {
+            (obj.person_id, obj.company_id)
+            for obj in session.new | session.dirty | session.deleted
+            if isinstance(obj, Employment)}
+        employment = Employment.__table__
+        query = select([
+            employment.c.person_id,
+            employment.c.company_id,
+            employment.c.salary,
+        ]).where(employment.c.person_id.in_(self.moved_people))
+        contracts = []
+        for person_id, company_id, salary in connection.execute(query):
+            if (person_id, company_id) not in changed:
+                contracts.append((-1, person_id, company_id, salary))
+                contracts.append((1, person_id, company_id, salary))
+        return contracts
+
+
+def _current_contract(obj):
+    """Returns a positive contract increment for new or changed Employment."""
+    return 1, obj.person_id, obj.company_id, obj.salary
+
+
+def _previous(obj, attr):
+    """Returns the value of the attribute before any pending change."""
+    history = get_history(obj, attr)
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(obj, attr)
+
+
+def _previous_contract(obj):
+    """Returns a negative contract increment for a changed Employment."""
+    return (
+        -1,
+        _previous(obj, 'person_id'),
+        _previous(obj, 'company_id'),
+        _previous(obj, 'salary'))
+
+
+class _StatisticsUpdate:
+    """Translates contract and population changes into table increments.
+
+    Contracts are 4-tuples of (sign, person_id, company_id, salary). Negative
+    contracts are attributed to the city a person lived in before moving (or
+    being deleted), as given by `previous_cities`.
+    """
+    def __init__(self, connection, previous_cities):
+        self.connection = connection
+        self.previous_cities = previous_cities
+        self.cities = defaultdict(lambda: defaultdict(int))
+        self.companies = defaultdict(lambda: defaultdict(int))
+        self.industries = defaultdict(lambda: defaultdict(int))
+
+    def apply(self, contracts, population, created):
+        """Collects all increments and writes them to the database.
+
+        Statistics rows are created for new cities and companies, so that
+        they are present even when no people live or work there.
+        """
+        for obj in created:
+            if isinstance(obj, City):
+                self.cities[obj.id]['population'] += 0
+            else:
+                self.companies[obj.id]['headcount'] += 0
+        for city_id, change in population.items():
+            self.cities[city_id]['population'] += change
+        self._add_contracts(contracts)
+        self._write(CityStatistics, self.cities)
+        self._write(CompanyStatistics, self.companies)
+        self._write(IndustryStatistics, self.industries)
+
+    def _add_contracts(self, contracts):
+        if not contracts:
+            return
+        person_ids = {contract[1] for contract in contracts}
+        company_ids = {contract[2] for contract in contracts}
+        person_cities = dict(self.connection.execute(
+            select([Person.id, Person.city_id])
+            .where(Person.id.in_(person_ids))).fetchall())
+        company, companies, industry = _company_industries(self.connection)
+        companies = {row.id: row for row in self.connection.execute(
+            select([company.c.id, company.c.city_id,
+                    industry.label('industry'), City.size_code])
+            .select_from(
+                companies.join(City.__table__, City.id == company.c.city_id))
+            .where(company.c.id.in_(company_ids)))}
+        for sign, person_id, company_id, salary in contracts:
+            company = companies[company_id]
+            city_id = person_cities.get(person_id)
+            if sign < 0:
+                city_id = self.previous_cities.get(person_id, city_id)
+            self.companies[company_id]['headcount'] += sign
+            self.companies[company_id]['payroll'] += sign * salary
+            industry = self.industries[company.industry, company.size_code]
+            industry['headcount'] += sign
+            industry['payroll'] += sign * salary
+            if city_id is not None:
+                self.cities[city_id]['employed'] += sign
+                if city_id != company.city_id:
+                    self.cities[city_id]['commuters'] += sign
+
+    def _write(self, model, increments):
+        """Updates (or inserts missing) rows with the collected increments."""
+        table = model.__table__
+        key_columns = list(table.primary_key.columns)
+        for key, values in increments.items():
+            key = key if isinstance(key, tuple) else (key,)
+            criteria = and_(*(
+                col == val for col, val in zip(key_columns, key)))
+            update = table.update().where(criteria).values({
+                table.c[name]: table.c[name] + value
+                for name, value in values.items()})
+            if self.connection.execute(update).rowcount == 0:
+                row = {col.name: val for col, val in zip(key_columns, key)}
+                row.update(values)
+                self.connection.execute(table.insert().values(row))
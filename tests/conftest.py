@@ -1,7 +1,19 @@
+import datetime
+import importlib.util
 import itertools
+import os
 
 import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
 
+from smallville.base import Base
+from smallville.models import (
+    City,
+    Company,
+    Employment,
+    Person,
+    TransportLink)
 from smallville.queues import (
     BinaryQueue,
     PairingQueue)
@@ -14,6 +26,86 @@ def pytest_addoption(parser):
         help="runs large sequence lengths to benchmark queue performance")
 
 
+SEED_SCRIPT = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)), 'scripts', 'seed.py')
+
+
+@pytest.fixture(scope='session')
+def seed():
+    """Returns the seed script, imported as a module."""
+    spec = importlib.util.spec_from_file_location('seed', SEED_SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def engine():
+    """Returns an engine for an in-memory SQLite database with all tables."""
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    return engine
+
+
+@pytest.fixture
+def session(engine):
+    """Returns a session on the empty database."""
+    with Session(bind=engine) as session:
+        yield session
+
+
+@pytest.fixture
+def world(engine):
+    """Returns a session on a small world of two cities and four people.
+
+    Anna and Bert live in Town (size S), Cleo and Dirk in City (size L). The
+    first three each work at their own company in the Food industry, named
+    after them ('Anna Inc'). Anna's company is in Town, Bert's and Cleo's
+    are in City, so Bert commutes. Dirk is unemployed, and the Media company
+    'Empty' in Town has no employees.
+    """
+    session = Session(bind=engine)
+    cities = {
+        name: City(id=num, name=name, size_code=size)
+        for num, (name, size) in enumerate([('Town', 'S'), ('City', 'L')], 1)}
+    for num, (name, home, work, salary) in enumerate([
+            ('Anna', 'Town', 'Town', 1000),
+            ('Bert', 'Town', 'City', 2000),
+            ('Cleo', 'City', 'City', 3000),
+            ('Dirk', 'City', None, None)], 1):
+        person = Person(
+            id=num, first_name=name, last_name='Doe', gender='x',
+            city=cities[home], birthday=datetime.date(1990, 1, num))
+        session.add(person)
+        if work is not None:
+            company = Company(
+                id=num, name=f'{name} Inc', industry='Food',
+                city=cities[work])
+            session.add(Employment(
+                person=person, company=company, role='worker', salary=salary))
+    session.add(Company(
+        id=4, name='Empty', industry='Media', city=cities['Town']))
+    session.commit()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def network(engine):
+    """Returns a session on a transport network of five cities, A to E."""
+    session = Session(bind=engine)
+    session.add_all([
+        City(id=num, name=name, size_code='S')
+        for num, name in enumerate('ABCDE', 1)])
+    for lower, higher, distance in [(1, 2, 10), (2, 3, 10), (1, 3, 25),
+                                    (3, 4, 5), (4, 5, 15)]:
+        session.add(TransportLink(
+            lower_city_id=lower, higher_city_id=higher, distance=distance))
+    session.commit()
+    yield session
+    session.close()
+
+
 @pytest.fixture(params=[BinaryQueue, PairingQueue])
 def queue(request):
     """Returns an empty Queue instance."""
@@ -0,0 +1,173 @@
+"""Test suite for the smallville.aio module."""
+
+import asyncio
+import datetime
+import functools
+
+import pytest
+from sqlalchemy import (
+    create_engine,
+    func,
+    select)
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from smallville import (
+    City,
+    Employment,
+    Person,
+    TransportLink)
+from smallville.aio import (
+    AsyncBulkSaver,
+    async_sessionmaker,
+    create_async_engine,
+    employers,
+    neighbours,
+    payroll,
+    records,
+    run_concurrently,
+    unemployed_people)
+from smallville.base import Base
+from smallville.metrics import StageMetrics
+
+pytest.importorskip('aiosqlite')
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """Returns an engine for a SQLite database file with all tables."""
+    engine = create_engine(f'sqlite:///{tmp_path / "smallville.db"}')
+    Base.metadata.create_all(engine)
+    return engine
+
+
+@pytest.fixture
+def url(engine, world):
+    """Returns the URL of the test world, with a third city and links."""
+    town, city = world.query(City).order_by(City.id)
+    village = City(name='Village', size_code='S')
+    world.add_all([
+        TransportLink(lower_city=town, higher_city=city, distance=10),
+        TransportLink(lower_city=town, higher_city=village, distance=3)])
+    world.commit()
+    return str(engine.url)
+
+
+def run(url, query):
+    """Runs a coroutine function on a new async engine for the URL."""
+    async def main():
+        engine = create_async_engine(url)
+        try:
+            return await query(engine)
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(main())
+
+
+def test_create_async_engine_driver():
+    """URLs without a driver are given an asyncio driver."""
+    assert create_async_engine('sqlite://').url.drivername == (
+        'sqlite+aiosqlite')
+
+
+def test_create_async_engine_pool_options():
+    """Pool sizing is applied when a pool class is given for SQLite."""
+    engine = create_async_engine(
+        'sqlite://', poolclass=AsyncAdaptedQueuePool, pool_size=1)
+    assert engine.pool.size() == 1
+
+
+def test_lookups(url):
+    """Employer, neighbour and payroll lookups return records."""
+    async def query(engine):
+        async with engine.connect() as connection:
+            return (
+                await employers(connection, 2),
+                await neighbours(connection, 1),
+                await payroll(connection, 1),
+                await payroll(connection, 42))
+
+    jobs, cities, company, missing = run(url, query)
+    assert [(job.name, job.salary) for job in jobs] == [('Bert Inc', 2000)]
+    assert [(city.name, city.distance) for city in cities] == [
+        ('Village', 3), ('City', 10)]
+    assert (company.headcount, company.payroll) == (1, 1000)
+    assert missing is None
+
+
+def test_run_concurrently(url):
+    """Concurrent queries each get a connection, results keep their order."""
+    async def query(engine):
+        return await run_concurrently(engine, *(
+            functools.partial(employers, person_id=person_id)
+            for person_id in [4, 1, 2] * 5))
+
+    results = run(url, query)
+    assert [len(jobs) for jobs in results] == [0, 1, 1] * 5
+    assert results[1][0].salary == 1000
+
+
+def test_run_concurrently_limit(url):
+    """No more than `limit` queries are in flight at the same time."""
+    in_flight = set()
+
+    async def count(connection):
+        in_flight.add(connection)
+        await asyncio.sleep(0.01)
+        running = len(in_flight)
+        in_flight.discard(connection)
+        return running
+
+    async def query(engine):
+        return await run_concurrently(engine, *[count] * 12, limit=3)
+
+    assert max(run(url, query)) == 3
+
+
+def test_records(url):
+    """Rows of a statement are streamed as records, across chunks."""
+    async def query(engine):
+        async with engine.connect() as connection:
+            statement = select([Person.id, Person.first_name]).order_by(
+                Person.id)
+            return [row async for row in records(
+                connection, statement, chunk_size=2)]
+
+    rows = run(url, query)
+    assert [row.first_name for row in rows] == [
+        'Anna', 'Bert', 'Cleo', 'Dirk']
+
+
+def test_unemployed_people(url):
+    async def query(engine):
+        async with async_sessionmaker(engine)() as session:
+            return [person.first_name async for person in unemployed_people(
+                session, chunk_size=1)]
+
+    assert run(url, query) == ['Dirk']
+
+
+def test_bulk_saver(url):
+    """Rows are inserted in mapping order, flushing at the threshold."""
+    metrics = StageMetrics('bulk')
+
+    async def query(engine):
+        async with async_sessionmaker(engine)() as session:
+            session.info['metrics'] = metrics
+            async with AsyncBulkSaver(
+                    session, Person, Employment, threshold=3) as saver:
+                for person_id in range(10, 14):
+                    await saver.add_mapping(Employment, {
+                        'person_id': person_id, 'company_id': 1,
+                        'role': 'worker', 'salary': 500})
+                    await saver.add_object(Person(
+                        id=person_id, first_name='New', last_name='Doe',
+                        gender='x', city_id=2,
+                        birthday=datetime.date(2000, 1, 1)))
+                await saver.add_object(None)
+            await session.commit()
+            return await session.scalar(
+                select([func.count()]).select_from(Employment.__table__))
+
+    assert run(url, query) == 7
+    assert (metrics.flushes, metrics.rows) == (3, 8)
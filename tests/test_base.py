@@ -0,0 +1,42 @@
+"""Test suite for the smallville.base module."""
+
+import pytest
+from sqlalchemy import (
+    create_engine,
+    inspect)
+
+from smallville.base import (
+    Base,
+    build_deferred_schema,
+    create_tables_deferred)
+
+
+@pytest.fixture
+def connection():
+    """Returns a connection to an empty in-memory SQLite database."""
+    engine = create_engine('sqlite://')
+    with engine.connect() as connection:
+        yield connection
+
+
+def test_deferred_tables_lack_indexes(connection):
+    """Tables created for bulk loading have no secondary indexes."""
+    create_tables_deferred(connection)
+    inspector = inspect(connection)
+    assert set(inspector.get_table_names()) == set(Base.metadata.tables)
+    for table in Base.metadata.tables:
+        assert inspector.get_indexes(table) == []
+
+
+def test_build_deferred_schema_creates_indexes(connection):
+    """Building the deferred schema creates all indexes from the metadata."""
+    create_tables_deferred(connection)
+    built = dict(build_deferred_schema(connection))
+    expected = {
+        index.name
+        for table in Base.metadata.tables.values()
+        for index in table.indexes}
+    assert set(built) == expected
+    assert all(duration >= 0 for duration in built.values())
+    indexes = inspect(connection).get_indexes('person')
+    assert [index['name'] for index in indexes] == ['ix_person_city_id']
@@ -0,0 +1,27 @@
+"""Test suite for the smallville.bulk module."""
+
+import datetime
+
+from smallville import (
+    City,
+    Person)
+from smallville.bulk import BulkSaver
+from smallville.connection import bulk_sessionmaker
+from smallville.metrics import StageMetrics
+
+
+def test_bulk_saver_flushes_at_threshold(engine):
+    """Rows are saved in mapping order whenever the threshold is reached."""
+    metrics = StageMetrics('bulk')
+    session = bulk_sessionmaker(engine, info={'metrics': metrics})()
+    with BulkSaver(session, City, Person, threshold=4) as batch:
+        for num in range(1, 4):
+            batch.add_mapping(Person, {
+                'id': num, 'first_name': 'Anna', 'last_name': 'Doe',
+                'gender': 'f', 'city_id': num,
+                'birthday': datetime.date(1990, 1, 1)})
+            batch.add_object(City(id=num, name=f'City {num}', size_code='S'))
+            batch.add_object(None)
+        assert session.query(Person).count() == 2
+    assert session.query(City).count() == session.query(Person).count() == 3
+    assert (metrics.flushes, metrics.rows) == (2, 6)
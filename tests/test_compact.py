@@ -0,0 +1,160 @@
+"""Test suite for the dictionary encoded schema in smallville.compact."""
+
+import datetime
+
+import pytest
+from sqlalchemy import (
+    create_engine,
+    inspect)
+from sqlalchemy.orm import Session
+
+from smallville import models
+from smallville.base import Base
+from smallville.compact import (
+    CompactBase,
+    Company,
+    FirstName,
+    Industry,
+    LastName,
+    Person,
+    encode_names,
+    is_compact)
+from smallville.records import model_records
+from smallville.statistics import (
+    maintain_statistics,
+    refresh_statistics)
+
+
+@pytest.fixture
+def session(world):
+    """Returns a session on the test world, converted to the compact schema."""
+    encode_names(world.connection())
+    world.commit()
+    with Session(bind=world.bind) as session:
+        yield session
+
+
+def test_encoded_columns(session):
+    """Name columns are replaced by keys, and names by lookup entries."""
+    columns = {
+        table: {column['name'] for column in inspect(
+            session.bind).get_columns(table)}
+        for table in ('person', 'company')}
+    assert {'first_name_id', 'last_name_id'} <= columns['person']
+    assert not {'first_name', 'last_name'} & columns['person']
+    assert 'industry' not in columns['company']
+    assert sorted(entry.name for entry in session.query(FirstName)) == [
+        'Anna', 'Bert', 'Cleo', 'Dirk']
+    assert session.query(LastName).count() == 1
+    assert session.query(Industry).count() == 2
+
+
+def test_attribute_api(session):
+    """Encoded names are available with the attribute names of before."""
+    people = session.query(Person).order_by(Person.id)
+    assert [(p.first_name, p.last_name) for p in people] == [
+        ('Anna', 'Doe'), ('Bert', 'Doe'), ('Cleo', 'Doe'), ('Dirk', 'Doe')]
+    company = session.query(Company).filter_by(name='Empty').one()
+    assert company.industry == 'Media'
+
+
+def test_query_expressions(session):
+    """Encoded names can be used in filters and selected with models."""
+    people = session.query(Person).filter(Person.first_name < 'C')
+    assert people.count() == 2
+    names = session.query(Person.first_name).select_from(Person)
+    assert sorted(name for name, in names) == ['Anna', 'Bert', 'Cleo', 'Dirk']
+
+
+def test_assign_names(session):
+    """Assigning names reuses existing lookup entries or creates them."""
+    anna, bert, cleo, _dirk = session.query(Person).order_by(Person.id)
+    bert.first_name = 'Anna'
+    anna.last_name = 'Poe'
+    cleo.last_name = 'Poe'
+    session.flush()
+    assert bert.first_name_id == anna.first_name_id
+    assert anna.last_name_id == cleo.last_name_id
+    assert session.query(FirstName).count() == 4
+    assert session.query(LastName).count() == 2
+
+
+def test_assign_before_session(session):
+    """Names assigned outside of a session are resolved on flush."""
+    person = Person(
+        first_name='Anna', last_name='Moe', gender='f', city_id=1,
+        birthday=datetime.date(2000, 1, 1))
+    assert (person.first_name, person.last_name) == ('Anna', 'Moe')
+    session.add(person)
+    session.flush()
+    anna = session.query(FirstName).filter_by(name='Anna').one()
+    assert person.first_name_id == anna.id
+    assert person.last_name == 'Moe'
+    assert session.query(LastName).count() == 2
+
+
+def test_assign_detached(session):
+    """Names cannot be assigned to objects that have left their session."""
+    person = session.query(Person).first()
+    session.expunge(person)
+    with pytest.raises(ValueError):
+        person.first_name = 'Eva'
+
+
+def test_model_records(session):
+    """Records of models with encoded names have their regular fields."""
+    connection = session.connection()
+    assert is_compact(connection)
+    people = model_records(
+        connection, models.Person, models.Person.first_name.in_(
+            ['Anna', 'Cleo']))
+    assert [(p.id, p.first_name, p.last_name) for p in people] == [
+        (1, 'Anna', 'Doe'), (3, 'Cleo', 'Doe')]
+    companies = model_records(connection, models.Company)
+    assert [company.industry for company in companies] == [
+        'Food', 'Food', 'Food', 'Media']
+
+
+def test_statistics(session):
+    """Statistics are refreshed and maintained on the compact schema."""
+    statistics = models.IndustryStatistics
+    refresh_statistics(session.connection())
+    assert session.query(
+        statistics.industry, statistics.size_code, statistics.headcount,
+        statistics.payroll,
+    ).order_by(statistics.industry, statistics.size_code).all() == [
+        ('Food', 'L', 2, 5000), ('Food', 'S', 1, 1000), ('Media', 'S', 0, 0)]
+    maintain_statistics(session)
+    session.add(models.Employment(
+        person_id=4, company_id=4, role='worker', salary=500))
+    session.add(Person(
+        first_name='Eva', last_name='Doe', gender='f', city_id=1,
+        birthday=datetime.date(2000, 1, 1)))
+    session.flush()
+    assert session.query(statistics.headcount).filter_by(
+        industry='Media').scalar() == 1
+    assert session.get(models.CityStatistics, 1).population == 3
+
+
+def test_snapshot(session, tmp_path):
+    """Snapshots of a converted database are loaded into the compact schema."""
+    snapshot = pytest.importorskip('smallville.snapshot')
+    saved = snapshot.save_snapshot(session.connection(), str(tmp_path))
+    assert saved.metadata is CompactBase.metadata
+    assert saved['industry'].decode('name').tolist() == ['Food', 'Media']
+    engine = create_engine('sqlite://')
+    CompactBase.metadata.create_all(engine)
+    with engine.begin() as connection:
+        row_counts = snapshot.load_snapshot(connection, saved)
+    assert row_counts['first_name'] == 4
+    with Session(bind=engine) as loaded:
+        assert [p.first_name for p in loaded.query(Person)] == [
+            'Anna', 'Bert', 'Cleo', 'Dirk']
+
+
+def test_compact_schema_complete():
+    """The compact metadata creates the complete schema on its own."""
+    engine = create_engine('sqlite://')
+    CompactBase.metadata.create_all(engine)
+    assert set(inspect(engine).get_table_names()) == (
+        set(Base.metadata.tables) | {'first_name', 'last_name', 'industry'})
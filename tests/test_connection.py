@@ -0,0 +1,82 @@
+"""Test suite for the smallville.connection module."""
+
+import getpass
+import os
+
+import pytest
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+
+from smallville import City
+from smallville.base import Base
+from smallville.connection import (
+    bulk_sessionmaker,
+    create_engine,
+    database_url,
+    readonly_sessionmaker)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """Returns a pooled engine for a SQLite database file with tables."""
+    url = f'sqlite:///{tmp_path / "smallville.db"}'
+    engine = create_engine(url, poolclass=QueuePool)
+    Base.metadata.create_all(engine)
+    return engine
+
+
+def test_database_url():
+    """The default database URL uses the current user and local socket."""
+    assert database_url() == f'postgresql://{getpass.getuser()}@/smallville'
+    assert database_url('other', 'alice', 'db.local') == (
+        'postgresql://alice@db.local/other')
+
+
+def test_create_engine_pool_options():
+    """Pool sizing and pre-ping settings are applied to the engine."""
+    engine = create_engine(
+        'sqlite://', poolclass=QueuePool, pool_size=3, max_overflow=1,
+        pool_timeout=7, pre_ping=False)
+    assert engine.pool._pre_ping is False
+    assert engine.pool.size() == 3
+    assert engine.pool._max_overflow == 1
+    assert engine.pool._timeout == 7
+    assert create_engine('sqlite://').pool._pre_ping is True
+
+
+def test_bulk_session(engine):
+    """Bulk sessions neither autoflush nor expire objects on commit."""
+    session = bulk_sessionmaker(engine)()
+    city = City(name='Bulk', size_code='S')
+    session.add(city)
+    assert session.query(City).count() == 0
+    session.commit()
+    assert 'name' in vars(city)
+
+
+def test_readonly_session_refuses_flush(engine):
+    """Read-only sessions allow queries but refuse to flush changes."""
+    session = readonly_sessionmaker(engine)()
+    assert session.query(City).all() == []
+    session.add(City(name='Readonly', size_code='S'))
+    with pytest.raises(exc.InvalidRequestError):
+        session.flush()
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='requires os.fork')
+def test_connections_not_shared_after_fork(engine):
+    """A forked process opens its own connections rather than reusing."""
+    with engine.connect() as connection:
+        parent_connection = id(connection.connection.dbapi_connection)
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:  # pragma: no cover (child process)
+        with engine.connect() as connection:
+            reused = id(connection.connection.dbapi_connection) == (
+                parent_connection)
+        os.write(write_fd, b'reused' if reused else b'new')
+        os._exit(0)
+    os.waitpid(pid, 0)
+    assert os.read(read_fd, 10) == b'new'
+    with engine.connect() as connection:
+        assert id(connection.connection.dbapi_connection) == parent_connection
@@ -0,0 +1,38 @@
+"""Test suite for the world generators of smallville.generators."""
+
+import collections
+import random
+
+from smallville.generators import synthetic_cities
+
+NAMES = ['Aalsmeer', 'Beverwijk', 'Castricum']
+
+
+def test_synthetic_city_names_cycle():
+    """Names are reused once exhausted, with an ordinal suffix."""
+    names = [name for name, _size in synthetic_cities(NAMES, {'S': 1}, 7)]
+    assert names == [
+        'Aalsmeer', 'Beverwijk', 'Castricum',
+        'Aalsmeer 2', 'Beverwijk 2', 'Castricum 2',
+        'Aalsmeer 3']
+
+
+def test_synthetic_city_names_unique():
+    cities = list(synthetic_cities(NAMES, {'S': 1}, 1000))
+    assert len({name for name, _size in cities}) == 1000
+
+
+def test_synthetic_city_sizes_weighted():
+    """Sizes are drawn following their relative weights."""
+    random.seed(1)
+    sizes = collections.Counter(
+        size for _name, size in synthetic_cities(
+            NAMES, {'S': 6, 'M': 3, 'L': 1, 'XL': 0}, 10000))
+    assert sizes.keys() == {'S', 'M', 'L'}
+    assert 5700 < sizes['S'] < 6300
+    assert 2700 < sizes['M'] < 3300
+    assert 850 < sizes['L'] < 1150
+
+
+def test_synthetic_cities_none():
+    assert list(synthetic_cities(NAMES, {'S': 1}, 0)) == []
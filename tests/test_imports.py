@@ -0,0 +1,77 @@
+"""Startup benchmark for importing the smallville package and submodules.
+
+Every import is measured in a fresh interpreter. Import times are only
+measured with `--bench`, which prints the best of several measurements for
+each module. Without it, only the lazy import checks run.
+"""
+
+import json
+import subprocess
+import sys
+
+import pytest
+
+SUBMODULES = [
+    'smallville',
+    'smallville.queues',
+    'smallville.pathfinding',
+    'smallville.metrics',
+    'smallville.base',
+    'smallville.models',
+    'smallville.generators',
+    'smallville.networks',
+    'smallville.connection',
+    'smallville.bulk',
+    'smallville.records',
+    'smallville.statistics',
+    'smallville.path_queries',
+    'smallville.compact',
+    'smallville.snapshot',
+    'smallville.simulation',
+    'smallville.aio']
+
+IMPORT_PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    'elapsed': elapsed,
+    'modules': [name for name in sys.modules if name.startswith('sqlalchemy')],
+}}))
+'''
+
+
+def probe_import(statement):
+    """Runs a statement in a fresh interpreter, returns time and modules."""
+    output = subprocess.run(
+        [sys.executable, '-c', IMPORT_PROBE.format(statement=statement)],
+        check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout
+    return json.loads(output)
+
+
+@pytest.mark.parametrize('module', [
+    'smallville',
+    'smallville.queues',
+    'smallville.pathfinding',
+    'smallville.metrics'])
+def test_import_without_sqlalchemy(module):
+    """The package and its pure-Python modules do not import SQLAlchemy."""
+    assert probe_import(f'import {module}')['modules'] == []
+
+
+def test_lazy_export_imports_models():
+    """Accessing a model on the package imports it from the models module."""
+    probe = probe_import('from smallville import Person')
+    assert 'sqlalchemy.orm' in probe['modules']
+
+
+@pytest.mark.parametrize('module', SUBMODULES)
+def test_import_time(request, capsys, module):
+    """Measures import time of each submodule in a fresh interpreter."""
+    if not request.config.getoption('bench'):
+        pytest.skip('import times are only measured with --bench')
+    timings = [
+        probe_import(f'import {module}')['elapsed'] for _repeat in range(5)]
+    with capsys.disabled():
+        print(f'\n{module:<24} {min(timings) * 1000:>8.1f} ms', end='')
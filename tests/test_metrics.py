@@ -0,0 +1,62 @@
+"""Test suite for the smallville.metrics module."""
+
+import io
+import json
+import tracemalloc
+
+from smallville.metrics import SeedMetrics
+
+
+def test_stage_written_as_json_line():
+    """Completing a stage writes a single JSON record to the stream."""
+    stream = io.StringIO()
+    metrics = SeedMetrics(stream)
+    with metrics.stage('cities') as stage:
+        stage.rows = 10
+    record = json.loads(stream.getvalue())
+    assert record['stage'] == 'cities'
+    assert record['rows'] == 10
+    assert record['wall_time'] >= 0
+    assert record['cpu_time'] >= 0
+    assert record['process_peak_rss_kb'] > 0
+    assert record['peak_traced_bytes'] is None
+
+
+def test_flushes_attributed_to_current_stage():
+    """Flushes count rows and latency towards the stage that is running."""
+    metrics = SeedMetrics()
+    metrics.record_flush(5, 1.0)
+    with metrics.stage('population'):
+        metrics.record_flush(100, 0.5)
+        metrics.record_flush(50, 1.5)
+    stage, = metrics.stages
+    assert stage.rows == 150
+    assert stage.flushes == 2
+    assert stage.flush_time == 2.0
+    assert stage.flush_time_max == 1.5
+    assert stage.as_dict()['flush_time_mean'] == 1.0
+
+
+def test_trace_memory_records_peak():
+    """With memory tracing enabled, the peak allocation size is recorded."""
+    metrics = SeedMetrics(trace_memory=True)
+    try:
+        with metrics.stage('allocate') as stage:
+            stage.rows = len(bytearray(2 ** 20))
+    finally:
+        tracemalloc.stop()
+    assert metrics.stages[0].peak_traced_bytes >= 2 ** 20
+
+
+def test_trace_memory_without_reset_peak(monkeypatch):
+    """Before Python 3.9, traces are cleared to reset the peak."""
+    monkeypatch.delattr(tracemalloc, 'reset_peak', raising=False)
+    metrics = SeedMetrics(trace_memory=True)
+    tracemalloc.start()
+    try:
+        retained = bytearray(2 ** 22)
+        with metrics.stage('allocate') as stage:
+            stage.rows = len(bytearray(2 ** 20))
+    finally:
+        tracemalloc.stop()
+    assert 2 ** 20 <= metrics.stages[0].peak_traced_bytes < len(retained)
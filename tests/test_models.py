@@ -0,0 +1,92 @@
+"""Test suite for the smallville.models module."""
+
+import gc
+
+import pytest
+from sqlalchemy import (
+    event,
+    inspect)
+from sqlalchemy.orm import Session
+
+from smallville import (
+    City,
+    TransportLink,
+    dijkstra,
+    load_network)
+
+
+@pytest.fixture
+def engine(engine, network):
+    """Returns the engine of the five city test network."""
+    return engine
+
+
+@pytest.fixture
+def statements(engine):
+    """Returns a list that collects all SQL statements that are executed."""
+    executed = []
+    event.listen(
+        engine, 'before_cursor_execute',
+        lambda conn, cursor, statement, *args: executed.append(statement))
+    return executed
+
+
+def test_load_network_queries(engine, statements):
+    """Loading the network and finding paths takes only two queries."""
+    session = Session(bind=engine)
+    cities = load_network(session)
+    start = next(city for city in cities if city.name == 'A')
+    distance, _path = dijkstra(cities, start)
+    assert {city.name: dist for city, dist in distance.items()} == {
+        'A': 0, 'B': 10, 'C': 20, 'D': 25, 'E': 40}
+    assert len(statements) == 2
+
+
+def test_transport_links_cached(engine):
+    """The transport link mapping is built once and then reused."""
+    city = Session(bind=engine).query(City).filter_by(name='C').one()
+    assert city.transport_links is city.transport_links
+    assert {other.name for other in city.transport_links} == {'A', 'B', 'D'}
+
+
+def test_transport_links_cache_cleared_on_new_link(engine):
+    """Adding a link updates the link mapping of both connected cities."""
+    session = Session(bind=engine)
+    cities = {city.name: city for city in load_network(session)}
+    assert cities['E'] not in cities['A'].transport_links
+    assert cities['A'] not in cities['E'].transport_links
+    TransportLink(lower_city=cities['A'], higher_city=cities['E'], distance=3)
+    assert cities['A'].transport_links[cities['E']] == 3
+    assert cities['E'].transport_links[cities['A']] == 3
+
+
+def test_transport_links_cache_cleared_on_distance_change(engine):
+    """Changing the distance of a link is reflected in the link mapping."""
+    session = Session(bind=engine)
+    cities = {city.name: city for city in load_network(session)}
+    assert cities['D'].transport_links[cities['E']] == 15
+    link, = cities['D']._links_higher
+    link.distance = 7
+    assert cities['D'].transport_links[cities['E']] == 7
+    assert cities['E'].transport_links[cities['D']] == 7
+
+
+def test_transport_links_cache_cleared_on_expire(engine):
+    """Expiring a city clears its cached link mapping."""
+    session = Session(bind=engine)
+    city = session.query(City).filter_by(name='D').one()
+    assert len(city.transport_links) == 2
+    session.delete(session.query(TransportLink).filter_by(distance=15).one())
+    session.flush()
+    session.expire(city)
+    assert len(city.transport_links) == 1
+
+
+def test_expire_collected_city(engine):
+    """Expiring a city that was garbage collected does not fail."""
+    session = Session(bind=engine)
+    state = inspect(session.query(City).filter_by(name='A').one())
+    gc.collect()
+    assert state.obj() is None
+    state.manager.dispatch.expire(state, None)
+    session.commit()
@@ -0,0 +1,99 @@
+"""Test suite for the transport network generator of smallville.networks."""
+
+import time
+
+import pytest
+
+from smallville.pathfinding import dijkstra
+
+numpy = pytest.importorskip('numpy')
+networks = pytest.importorskip('smallville.networks')
+
+TOPOLOGIES = ['chain', 'geometric', 'small_world']
+CITY_IDS = list(range(10, 1010, 2))
+
+
+@pytest.fixture(params=TOPOLOGIES)
+def topology(request):
+    return request.param
+
+
+def test_unique_ordered_links(topology):
+    """Links connect existing cities, lower to higher, without duplicates."""
+    lower, higher, distance = networks.transport_network(
+        CITY_IDS, topology, seed=1)
+    assert len(lower) == len(higher) == len(distance) > len(CITY_IDS)
+    assert (lower < higher).all()
+    assert set(lower) | set(higher) <= set(CITY_IDS)
+    pairs = list(zip(lower.tolist(), higher.tolist()))
+    assert pairs == sorted(set(pairs))
+    assert (distance > 0).all()
+
+
+def test_reproducible_with_seed(topology):
+    """Networks generated with the same seed are identical."""
+    first, second = (
+        networks.transport_network(CITY_IDS, topology, seed=42)
+        for _repeat in range(2))
+    for column_a, column_b in zip(first, second):
+        assert column_a.tolist() == column_b.tolist()
+
+
+@pytest.mark.parametrize('count', [0, 1, 2])
+def test_tiny_networks(topology, count):
+    """Networks of fewer than three cities have at most a single link."""
+    lower, _higher, _distance = networks.transport_network(
+        range(count), topology)
+    assert len(lower) == max(0, count - 1)
+
+
+def test_unknown_topology():
+    with pytest.raises(ValueError):
+        networks.transport_network(CITY_IDS, 'hypercube')
+
+
+def test_chain_network_connected():
+    """Chain networks connect all cities, with distances in range."""
+    edges = networks.transport_network(
+        CITY_IDS, 'chain', distance_range=(3, 5))
+    assert set(edges.distance) == {3, 4, 5}
+    vertices = networks.network_vertices(edges)
+    distance, _previous = dijkstra(vertices, vertices[CITY_IDS[0]])
+    assert len(distance) == len(CITY_IDS)
+
+
+def test_geometric_network_neighbours():
+    """Every city in a geometric network links to its nearest neighbours."""
+    edges = networks.transport_network(
+        CITY_IDS, 'geometric', neighbours=5, seed=3)
+    vertices = networks.network_vertices(edges)
+    assert len(vertices) == len(CITY_IDS)
+    degrees = [len(vertex.transport_links) for vertex in vertices.values()]
+    assert min(degrees) >= 5
+
+
+def test_small_world_without_rewiring():
+    """Without rewiring, a small world network is a regular ring lattice."""
+    lower, higher, _distance = networks.transport_network(
+        range(100), 'small_world', neighbours=6, rewire_chance=0)
+    assert len(lower) == 300
+    ring_offsets = numpy.minimum(higher - lower, 100 - (higher - lower))
+    assert set(ring_offsets) == {1, 2, 3}
+
+
+def test_million_edge_networks(request, capsys, topology):
+    """Networks of around a million links are generated in seconds."""
+    if not request.config.getoption('bench'):
+        pytest.skip('large networks are only generated with --bench')
+    city_count, params = {
+        'chain': (40000, {}),
+        'geometric': (200000, {'neighbours': 8}),
+        'small_world': (250000, {'neighbours': 8})}[topology]
+    start = time.perf_counter()
+    edges = networks.transport_network(
+        range(city_count), topology, seed=1, **params)
+    elapsed = time.perf_counter() - start
+    with capsys.disabled():
+        print(f'\n{topology:<12} {len(edges.distance):>9} links '
+              f'{elapsed:>6.2f} s', end='')
+    assert len(edges.distance) > 900000
@@ -0,0 +1,109 @@
+"""Test suite for the smallville.path_queries module."""
+
+import datetime
+
+import pytest
+from sqlalchemy import (
+    distinct,
+    func,
+    select)
+
+from smallville import (
+    City,
+    Person,
+    TransportLink)
+from smallville.path_queries import (
+    nearest_cities,
+    shortest_paths)
+from smallville.pathfinding import dijkstra
+
+
+@pytest.fixture
+def session(network):
+    """Returns a session on the five city test network."""
+    return network
+
+
+def distances(session, query):
+    """Returns a dictionary of distance per (origin_id, city_id) pair."""
+    return {(row.origin_id, row.city_id): row.distance
+            for row in session.execute(query)}
+
+
+def test_shortest_paths(session):
+    """Distances follow the shortest route, also against link direction."""
+    assert distances(session, shortest_paths([1, 5], max_distance=100)) == {
+        (1, 1): 0, (1, 2): 10, (1, 3): 20, (1, 4): 25, (1, 5): 40,
+        (5, 5): 0, (5, 4): 15, (5, 3): 20, (5, 2): 30, (5, 1): 40}
+
+
+@pytest.mark.parametrize('bounds, reached', [
+    ({'max_distance': 20}, {1: 0, 2: 10, 3: 20}),
+    ({'max_hops': 1}, {1: 0, 2: 10, 3: 25}),
+    ({'max_hops': 2, 'max_distance': 30}, {1: 0, 2: 10, 3: 20, 4: 30}),
+])
+def test_shortest_paths_bounds(session, bounds, reached):
+    query = shortest_paths([1], **bounds)
+    assert distances(session, query) == {
+        (1, city): distance for city, distance in reached.items()}
+
+
+def test_shortest_paths_require_bound():
+    with pytest.raises(ValueError):
+        shortest_paths([1])
+
+
+def test_shortest_paths_from_subquery(session):
+    """Origins can be a SELECT, and the search used in a larger query."""
+    for name, city_id in [('Anna', 1), ('Bert', 1), ('Cleo', 4)]:
+        session.add(Person(
+            first_name=name, last_name='Doe', gender='x', city_id=city_id,
+            birthday=datetime.date(1990, 1, 1)))
+    homes = select([distinct(Person.city_id)])
+    paths = shortest_paths(homes, max_distance=15).subquery()
+    query = select([City.name, func.count()]).select_from(
+        City.__table__.join(paths, paths.c.city_id == City.id)
+    ).group_by(City.name).order_by(City.name)
+    assert session.execute(query).fetchall() == [
+        ('A', 1), ('B', 2), ('C', 1), ('D', 1), ('E', 1)]
+
+
+def test_nearest_cities(session):
+    """The nearest cities exclude the origin, and are ranked by distance."""
+    query = nearest_cities([3], 3, max_hops=3)
+    assert [tuple(row) for row in session.execute(query)] == [
+        (3, 4, 5, 1), (3, 2, 10, 2), (3, 1, 20, 3)]
+
+
+def test_nearest_cities_within_bounds(session):
+    """Fewer cities are returned when the bounds don't reach far enough."""
+    query = nearest_cities([1, 5], 3, max_distance=20)
+    assert distances(session, query) == {
+        (1, 2): 10, (1, 3): 20, (5, 4): 15, (5, 3): 20}
+
+
+def test_generated_network_matches_dijkstra(engine):
+    """Distances on a generated network equal those found by dijkstra."""
+    networks = pytest.importorskip('smallville.networks')
+    city_ids = list(range(1, 61))
+    edges = networks.transport_network(
+        city_ids, 'small_world', distance_range=(5, 15), seed=7)
+    with engine.begin() as connection:
+        connection.execute(City.__table__.insert(), [
+            {'id': num, 'name': str(num), 'size_code': 'S'}
+            for num in city_ids])
+        connection.execute(TransportLink.__table__.insert(), [
+            {'lower_city_id': lower, 'higher_city_id': higher,
+             'distance': distance}
+            for lower, higher, distance in zip(*(
+                column.tolist() for column in edges))])
+        found = distances(
+            connection, shortest_paths(city_ids[:5], max_distance=40))
+    vertices = networks.network_vertices(edges)
+    expected = {}
+    for origin in city_ids[:5]:
+        distance, _previous = dijkstra(vertices, vertices[origin])
+        expected.update({
+            (origin, vertex.id): dist for vertex, dist in distance.items()
+            if dist <= 40})
+    assert found == expected
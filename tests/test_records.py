@@ -0,0 +1,48 @@
+"""Test suite for the smallville.records module."""
+
+import pytest
+
+from smallville import (
+    City,
+    Person)
+from smallville.records import (
+    column_chunks,
+    model_records,
+    payroll_by_company,
+    population_by_city,
+    records)
+
+
+@pytest.fixture
+def connection(world):
+    """Returns a connection to the test world, with an uninhabited city."""
+    world.add(City(name='Ghost', size_code='S'))
+    world.commit()
+    with world.bind.connect() as connection:
+        yield connection
+
+
+def test_model_records(connection):
+    """Model records are named tuples with the table's column names."""
+    people = list(model_records(connection, Person, Person.id > 1))
+    assert [person.first_name for person in people] == [
+        'Bert', 'Cleo', 'Dirk']
+    assert people[0]._fields == tuple(Person.__table__.columns.keys())
+    assert not hasattr(people[0], '__dict__')
+
+
+def test_records_chunked(connection):
+    """Records are streamed regardless of the chunk size."""
+    rows = list(records(connection, payroll_by_company(), chunk_size=1))
+    assert [(row.name, row.headcount, row.payroll) for row in rows] == [
+        ('Anna Inc', 1, 1000), ('Bert Inc', 1, 2000), ('Cleo Inc', 1, 3000),
+        ('Empty', 0, 0)]
+
+
+def test_column_chunks(connection):
+    """Columnar chunks map column names to tuples of values."""
+    chunks = list(column_chunks(connection, population_by_city(), 1))
+    assert chunks == [
+        {'city_id': (1,), 'name': ('Town',), 'population': (2,)},
+        {'city_id': (2,), 'name': ('City',), 'population': (2,)},
+        {'city_id': (3,), 'name': ('Ghost',), 'population': (0,)}]
@@ -0,0 +1,43 @@
+"""Test suite for the seed script."""
+
+import random
+
+import pytest
+from sqlalchemy import func
+
+from smallville import (
+    City,
+    Company,
+    Person)
+from smallville.connection import bulk_sessionmaker
+
+
+@pytest.fixture
+def session(engine):
+    """Returns a bulk session on the empty database."""
+    return bulk_sessionmaker(engine)()
+
+
+def test_topology_requires_scale(seed):
+    """A network topology is only accepted for scaled worlds."""
+    assert seed.parse_arguments(['--scale', '5', '--topology', 'geometric'])
+    with pytest.raises(SystemExit):
+        seed.parse_arguments(['--topology', 'geometric'])
+
+
+@pytest.mark.parametrize('city_count', [0, 3])
+def test_create_world(seed, session, city_count):
+    """Synthesized worlds have unique city names and all their people."""
+    random.seed(city_count)
+    cities = list(seed.create_world(session, city_count))
+    assert len(cities) == city_count
+    names = [name for name, in session.query(City.name)]
+    assert sorted(names) == sorted(city.name for city in cities)
+    assert len(set(names)) == city_count
+    population = dict(session.query(
+        Person.city_id, func.count()).group_by(Person.city_id))
+    assert population == {
+        city.id: city.population_size for city in cities
+        if city.population_size}
+    assert session.query(Company).count() == sum(
+        city.company_count for city in cities)
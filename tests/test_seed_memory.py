@@ -0,0 +1,112 @@
+"""Memory regression benchmark for the stages of the seed script.
+
+Every seed stage is run against an in-memory SQLite database for worlds of
+several sizes (the number of cities taken from the seed city list), while
+`tracemalloc` records the peak of Python allocations. A stage's growth is its
+peak minus the allocations traced when it started, which excludes data kept
+alive by earlier stages. A stage fails when its growth exceeds the budget (in
+MiB) configured for it in `memory_budgets.json`, reporting the source lines
+where memory grew the most during the stage.
+
+As tracing allocations slows down seeding considerably, these only run when
+`--bench` is given, which also prints the growth and budget of every stage.
+"""
+
+import json
+import os
+import random
+import tracemalloc
+
+import pytest
+from sqlalchemy import create_engine
+
+from smallville.base import Base
+from smallville.connection import bulk_sessionmaker
+from smallville.metrics import SeedMetrics
+
+HERE = os.path.dirname(__file__)
+with open(os.path.join(HERE, 'memory_budgets.json')) as fp:
+    BUDGETS = json.load(fp)
+STAGES = [
+    'cities',
+    'transport_network',
+    'population',
+    'commuters',
+    'self_employment']
+HOTSPOT_COUNT = 10
+
+
+def run_stages(seed, session, city_count):
+    """Yields stage names, running the named stage when resumed."""
+    yield 'cities'
+    cities = list(seed.create_cities(session, limit=city_count))
+    yield 'transport_network'
+    list(seed.create_transport_network(session, cities))
+    session.flush()
+    yield 'population'
+    seed.create_population(session, cities)
+    yield 'commuters'
+    seed.create_commuters(session, cities)
+    yield 'self_employment'
+    seed.create_self_employment(session)
+
+
+def hotspots(before_file, limit=HOTSPOT_COUNT):
+    """Returns lines describing where memory grew since a saved snapshot."""
+    after = tracemalloc.take_snapshot()
+    before = tracemalloc.Snapshot.load(before_file)
+    differences = after.compare_to(before, 'lineno')
+    return [str(stat) for stat in differences[:limit] if stat.size_diff > 0]
+
+
+@pytest.fixture(scope='module', params=sorted(BUDGETS, key=int))
+def seeded_world(request, tmp_path_factory, seed):
+    """Seeds a world of the given size, returns per-stage memory results.
+
+    Results are a dictionary of stage names mapped to the stage's growth of
+    traced allocations in bytes, and the allocation hot spots of the stage.
+    The snapshot taken before every stage is kept on disk, so that it does
+    not add to the stage's peak.
+    """
+    if not request.config.getoption('bench'):
+        pytest.skip('memory benchmarks only run with --bench')
+    random.seed(request.param)
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    metrics = SeedMetrics(trace_memory=True)
+    session = bulk_sessionmaker(engine, info={'metrics': metrics})()
+    before_file = str(tmp_path_factory.mktemp('tracemalloc') / 'before')
+    results = {}
+    stages = run_stages(seed, session, int(request.param))
+    tracemalloc.start()
+    try:
+        name = next(stages)
+        while name is not None:
+            tracemalloc.take_snapshot().dump(before_file)
+            start_bytes = tracemalloc.get_traced_memory()[0]
+            with metrics.stage(name) as stage:
+                following = next(stages, None)
+            growth = stage.peak_traced_bytes - start_bytes
+            results[name] = growth, hotspots(before_file)
+            name = following
+    finally:
+        tracemalloc.stop()
+        session.close()
+        engine.dispose()
+    return request.param, results
+
+
+@pytest.mark.parametrize('stage_name', STAGES)
+def test_stage_memory_budget(capsys, seeded_world, stage_name):
+    """The growth of traced allocations of each stage stays within budget."""
+    world_size, results = seeded_world
+    growth, stage_hotspots = results[stage_name]
+    growth_mb = growth / 2 ** 20
+    budget_mb = BUDGETS[world_size][stage_name]
+    with capsys.disabled():
+        print(f'\n{world_size:>3} cities  {stage_name:<18} '
+              f'{growth_mb:>6.1f} MiB of {budget_mb:>4} MiB', end='')
+    assert growth_mb <= budget_mb, '\n'.join([
+        f'{stage_name} grew by {growth_mb:.1f} MiB for {world_size} cities, '
+        f'over its budget of {budget_mb} MiB. Largest growth:',
+        *stage_hotspots])
@@ -0,0 +1,130 @@
+"""Test suite for the smallville.simulation module."""
+
+import datetime
+
+import pytest
+from sqlalchemy.orm import Session
+
+from smallville import (
+    City,
+    Company,
+    Employment,
+    Person)
+
+numpy = pytest.importorskip('numpy')
+simulation = pytest.importorskip('smallville.simulation')
+
+SALARY_BANDS = {size: [3000, 300] for size in ('S', 'M', 'L', 'XL')}
+HIRING_SLOWDOWN = {size: [1.1, 0.01] for size in ('S', 'M', 'L', 'XL')}
+
+
+@pytest.fixture
+def connection(engine):
+    """Returns a connection to a world of two cities with people and jobs."""
+    session = Session(bind=engine)
+    for city_name, size in [('Town', 'S'), ('City', 'L')]:
+        city = City(name=city_name, size_code=size)
+        companies = [
+            Company(name=f'{city_name} {num}', industry='Food', city=city)
+            for num in range(5)]
+        for num in range(100):
+            person = Person(
+                first_name=f'{num}', last_name=city_name, gender='x',
+                city=city, birthday=datetime.date(1950 + num % 50, 6, 1))
+            session.add(person)
+            if num % 2:
+                session.add(Employment(
+                    person=person, company=companies[num % 5],
+                    role='worker', salary=2500))
+    session.commit()
+    with engine.connect() as connection:
+        yield connection
+
+
+@pytest.fixture
+def world(connection):
+    """Returns a simulation loaded from the test world."""
+    return simulation.Simulation.load(
+        connection, SALARY_BANDS, HIRING_SLOWDOWN,
+        date=datetime.date(2018, 1, 1), seed=42)
+
+
+def test_load_state(world):
+    """People, contracts and company headcounts are loaded into arrays."""
+    assert len(world.person_id) == 200
+    assert (world.employer >= 0).sum() == 100
+    assert world.headcount.tolist() == [10] * 10
+    assert set(world.salary[world.employer >= 0]) == {2500}
+
+
+def test_tick_consistency(world):
+    """After ticks, headcounts still match the employment of people."""
+    world.run(3)
+    assert world.date == datetime.date(2021, 1, 1)
+    employed = world.employer[world.employer >= 0]
+    assert world.headcount.tolist() == numpy.bincount(
+        employed, minlength=len(world.headcount)).tolist()
+    assert (world.salary[world.employer < 0] == 0).all()
+
+
+def test_retirement(world):
+    """People at retirement age do not hold any jobs."""
+    world.run(2)
+    retired = world.age() >= world.RETIREMENT_AGE
+    assert retired.any()
+    assert (world.employer[retired] < 0).all()
+
+
+def test_hiring_within_city(world):
+    """People are only hired by companies in the city they live in."""
+    world.run(5)
+    employed = numpy.flatnonzero(world.employer >= 0)
+    company_city = numpy.repeat(numpy.arange(2), 5)
+    assert (company_city[world.employer[employed]] ==
+            world.person_city[employed]).all()
+
+
+def test_write_back(connection, world):
+    """Writing back makes the database match the simulated contracts."""
+    world.run(2)
+    changes = world.write_back(connection)
+    assert changes['ended'] > 0
+    assert changes['started'] > 0
+    employed = numpy.flatnonzero(world.employer >= 0)
+    expected = sorted(zip(
+        world.person_id[employed].tolist(),
+        world.company_id[world.employer[employed]].tolist(),
+        world.salary[employed].tolist()))
+    stored = connection.execute(
+        'SELECT person_id, company_id, salary FROM employment').fetchall()
+    assert sorted(map(tuple, stored)) == expected
+    assert world.write_back(connection) == {
+        'ended': 0, 'started': 0, 'salary_changed': 0}
+
+
+def test_employment_stable_without_retirement():
+    """Hiring makes up for turnover, when nobody reaches retirement age.
+
+    The 20 companies are as full as seeding leaves them: with 45 employees,
+    their chance of hiring another is well below 1%.
+    """
+    people = {
+        'id': numpy.arange(1000),
+        'city_id': numpy.arange(1000) % 2,
+        'birthday': [datetime.date(1990, 1, 1)] * 1000}
+    companies = {
+        'id': numpy.arange(20),
+        'city_id': numpy.arange(20) % 2,
+        'size_code': numpy.zeros(20, int)}
+    contracts = {
+        'person_id': numpy.arange(900),
+        'company_id': numpy.arange(900) % 20,
+        'role': numpy.zeros(900, int),
+        'salary': numpy.full(900, 2500)}
+    slowdown = {size: [1.2, 0.01] for size in SALARY_BANDS}
+    world = simulation.Simulation(
+        people, contracts, companies, SALARY_BANDS, slowdown,
+        date=datetime.date(2018, 1, 1), seed=42)
+    for _year in range(10):
+        world.tick()
+        assert 850 <= (world.employer >= 0).sum() <= 950
@@ -0,0 +1,97 @@
+"""Test suite for the smallville.snapshot module."""
+
+import os
+
+import pytest
+from sqlalchemy import (
+    create_engine,
+    exc)
+
+from smallville import (
+    City,
+    Person,
+    TransportLink)
+from smallville.base import Base
+from smallville.connection import database_url
+
+numpy = pytest.importorskip('numpy')
+snapshot = pytest.importorskip('smallville.snapshot')
+
+
+@pytest.fixture
+def engine(engine, world):
+    """Returns the engine of the test world, with a link and an income."""
+    town, city = world.query(City).order_by(City.id)
+    world.add(TransportLink(lower_city=town, higher_city=city, distance=12))
+    dirk = world.query(Person).filter_by(first_name='Dirk').one()
+    dirk.self_employment_income = 800
+    world.commit()
+    return engine
+
+
+@pytest.fixture
+def postgresql():
+    """Returns a connection to a PostgreSQL test database, in a transaction.
+
+    The database is given by the SMALLVILLE_TEST_POSTGRESQL environment
+    variable, defaulting to the local `smallville_test` database. All
+    changes, including created tables, are rolled back afterwards.
+    """
+    pytest.importorskip('psycopg2')
+    url = os.environ.get(
+        'SMALLVILLE_TEST_POSTGRESQL', database_url('smallville_test'))
+    try:
+        connection = create_engine(url).connect()
+    except exc.OperationalError:
+        pytest.skip(f'PostgreSQL server not available at {url}')
+    transaction = connection.begin()
+    yield connection
+    transaction.rollback()
+    connection.close()
+
+
+def table_contents(connection):
+    """Returns the rows of all tables, keyed by table name."""
+    return {
+        table.name: connection.execute(table.select()).fetchall()
+        for table in Base.metadata.sorted_tables}
+
+
+def test_snapshot_columns(engine, tmp_path):
+    """Saved columns are memory-mapped and decoded to their original values."""
+    with engine.connect() as connection:
+        world = snapshot.save_snapshot(connection, str(tmp_path))
+    people = snapshot.Snapshot(str(tmp_path))['person']
+    assert len(people) == len(world['person']) == 4
+    assert isinstance(people['id'], numpy.memmap)
+    assert list(people.decode('first_name')) == [
+        'Anna', 'Bert', 'Cleo', 'Dirk']
+    assert list(people.categories('last_name')) == ['Doe']
+    assert list(people.categories('gender')) == ['f', 'm', 'x']
+    income = people.decode('self_employment_income')
+    assert income.mask.tolist() == [True, True, True, False]
+    assert income[3] == 800
+    assert people['birthday'][1] == numpy.datetime64('1990-01-02')
+
+
+def test_snapshot_roundtrip(engine, tmp_path):
+    """Loading a saved snapshot recreates the original table contents."""
+    with engine.connect() as connection:
+        snapshot.save_snapshot(connection, str(tmp_path))
+        expected = table_contents(connection)
+    target = create_engine('sqlite://')
+    Base.metadata.create_all(target)
+    with target.begin() as connection:
+        row_counts = snapshot.load_snapshot(connection, str(tmp_path))
+        assert table_contents(connection) == expected
+    assert row_counts == {name: len(rows) for name, rows in expected.items()}
+
+
+def test_snapshot_roundtrip_postgresql(engine, postgresql, tmp_path):
+    """Snapshots load into PostgreSQL using COPY, keeping NULL values."""
+    with engine.connect() as connection:
+        snapshot.save_snapshot(connection, str(tmp_path))
+        expected = table_contents(connection)
+    Base.metadata.create_all(postgresql)
+    snapshot.load_snapshot(postgresql, str(tmp_path))
+    assert table_contents(postgresql) == expected
@@ -0,0 +1,143 @@
+"""Test suite for the smallville.statistics module."""
+
+import datetime
+
+import pytest
+
+from smallville import (
+    City,
+    Company,
+    Employment,
+    Person,
+    TransportLink)
+from smallville.models import (
+    CityStatistics,
+    CompanyStatistics,
+    IndustryStatistics)
+from smallville.statistics import (
+    maintain_statistics,
+    refresh_commute_distances,
+    refresh_statistics)
+
+
+@pytest.fixture
+def session(world):
+    """Returns a session on the test world, with maintained statistics."""
+    refresh_statistics(world.connection())
+    world.commit()
+    maintain_statistics(world)
+    return world
+
+
+def statistics(session):
+    """Returns the contents of all statistics tables."""
+    return {
+        model.__tablename__: sorted(session.execute(
+            model.__table__.select()).fetchall())
+        for model in (CityStatistics, CompanyStatistics, IndustryStatistics)}
+
+
+def assert_maintained(session):
+    """Asserts that maintained statistics are equal to a full refresh."""
+    session.flush()
+    maintained = statistics(session)
+    refresh_statistics(session.connection())
+    assert maintained == statistics(session)
+
+
+def person(session, name):
+    return session.query(Person).filter_by(first_name=name).one()
+
+
+def commute_distances(session):
+    """Returns the commute distances of people, by their first name."""
+    session.expire_all()
+    return {
+        contract.person.first_name: contract.commute_distance
+        for contract in session.query(Employment)}
+
+
+def test_refresh_statistics(session):
+    """The refresh builds correct statistics from people and employment."""
+    town = session.query(CityStatistics).join(City).filter_by(name='Town')
+    assert town.one().population == 2
+    assert town.one().employed == 2
+    assert town.one().commuter_share == 0.5
+    food = session.query(IndustryStatistics).filter_by(industry='Food')
+    assert {(row.size_code, row.average_salary) for row in food} == {
+        ('S', 1000), ('L', 2500)}
+    empty = session.query(CompanyStatistics).join(Company).filter_by(
+        name='Empty').one()
+    assert empty.headcount == 0
+    assert empty.average_salary is None
+
+
+def test_statistics_hybrid_expressions(session):
+    """Derived figures can be used in queries."""
+    query = session.query(City.name).join(CityStatistics).filter(
+        CityStatistics.employment_rate > 0.75)
+    assert [name for name, in query] == ['Town']
+
+
+def test_maintain_new_employment(session):
+    """Hiring someone updates company, industry and city statistics."""
+    company = session.query(Company).filter_by(name='Empty').one()
+    session.add(Employment(
+        person=person(session, 'Dirk'), company=company,
+        role='worker', salary=1500))
+    assert_maintained(session)
+
+
+def test_maintain_new_people_and_companies(session):
+    """New people, cities and companies are added to the statistics."""
+    village = City(name='Village', size_code='S')
+    session.add(Employment(
+        person=Person(
+            first_name='Eva', last_name='Doe', gender='f', city=village,
+            birthday=datetime.date(1991, 1, 1)),
+        company=Company(
+            name='Eva Inc', industry='Media',
+            city=session.query(City).filter_by(name='City').one()),
+        role='director', salary=5000))
+    assert_maintained(session)
+
+
+def test_maintain_salary_change_and_deletion(session):
+    """Salary changes and ended contracts are reflected in statistics."""
+    anna, bert = person(session, 'Anna'), person(session, 'Bert')
+    anna.employment[0].salary = 1250
+    session.delete(bert.employment[0])
+    assert_maintained(session)
+
+
+def test_maintain_moving_people(session):
+    """Moving to another city moves population and employment figures."""
+    person(session, 'Bert').city = session.query(City).filter_by(
+        name='City').one()
+    person(session, 'Dirk').city_id = 1
+    assert_maintained(session)
+
+
+def test_maintain_deleted_person(session):
+    """Deleting a person reduces the population of their city."""
+    session.delete(person(session, 'Dirk'))
+    assert_maintained(session)
+
+
+def test_commute_distances_unreachable(session):
+    """Without transport links, only local commutes have a distance."""
+    assert refresh_commute_distances(session.connection()) == 3
+    assert commute_distances(session) == {'Anna': 0, 'Bert': None, 'Cleo': 0}
+
+
+def test_commute_distances_shortest_path(session):
+    """Commute distances follow the shortest path through the network."""
+    town, city = session.query(City).order_by(City.id)
+    village = City(name='Village', size_code='S')
+    session.add_all([
+        TransportLink(lower_city=town, higher_city=city, distance=10),
+        TransportLink(lower_city=town, higher_city=village, distance=3),
+        TransportLink(lower_city=city, higher_city=village, distance=4)])
+    session.flush()
+    refresh_commute_distances(session.connection())
+    assert commute_distances(session) == {'Anna': 0, 'Bert': 7, 'Cleo': 0}